@@ -1,11 +1,70 @@
-import os
+import copy
 import csv
+import math
+import os
+import re
 import yaml
+from core import utils
+
+# Prefer the libyaml C backend, fall back to the pure-Python loader/dumper
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+# DAC voltages written by modify_dac_config (active stage DACs / the rest)
+DAC_ACTIVE_VOLTAGE = b'-4.5'
+DAC_IDLE_VOLTAGE = b'-2.5'
+
+# Step (ns) an in-place DAC patch moves the mtime on when the write didn't;
+# coarse enough for NTFS's 100 ns timestamps
+MTIME_BUMP_NS = 1_000_000
+
+# Matches the DP1 CH2 voltage line in the block layout written by modify_power_config
+DP1_CH2_VOLTAGE_RE = re.compile(
+    r'^(-[ \t]*instrument:[ \t]*DP1[ \t]*\n[ \t]+channel:[ \t]*2[ \t]*\n[ \t]+voltage:[ \t]*)[-+\d.eE]+',
+    re.MULTILINE)
 
 class ConfigManager:
     def __init__(self):
         self.dac_config_path = "DAC_Config.csv"
         self.power_config_path = "Power_Config.yaml"
+        self.limit_path = "Power_limit_config.yaml"
+
+        # Power limits don't change during a run; re-parse only when the file mtime moves
+        self._limits_cache = None
+        self._limits_mtime = None
+
+        # Last stage/voltage written and the file mtime right after writing it;
+        # a matching pair means the file on disk is already what we would write
+        self._last_dac_stage = None
+        self._last_dac_mtime = None
+        self._last_power_voltage = None
+        self._last_power_mtime = None
+        # Power_Config.yaml text as last read/written, valid while the file's
+        # (mtime, size) still matches _power_text_key
+        self._power_text = None
+        self._power_text_key = None
+
+        # Byte offsets of the DAC1..DAC7 Voltage fields from the last full rewrite,
+        # valid while the file's (mtime, size) still matches _dac_offsets_key
+        self._dac_offsets = None
+        self._dac_offsets_key = None
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def _file_key(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
 
     def modify_dac_config(self, stage_index):
         """
@@ -19,36 +78,88 @@ class ConfigManager:
             print(f"Warning: {self.dac_config_path} not found.")
             return
 
-        rows = []
-        with open(self.dac_config_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            fieldnames = reader.fieldnames
-            for row in reader:
-                ch_name = row['Channel']
-                # Check if channel is DAC1..DAC32 (format DACx)
-                if ch_name.startswith('DAC'):
-                    try:
-                        idx = int(ch_name.replace('DAC', ''))
-                        # Logic: DAC 1 to i = -4.5V
-                        # Note: SRS says "DAC 1...i". Assuming 1-based index for logic, but file might be 0-based or 1-based.
-                        # Looking at previous DAC_Config.csv, it has DAC0, DAC1...
-                        # SRS v3.0 Table: Stage 1 -> DAC1.
-                        # Let's assume we modify DAC1, DAC2... based on stage.
-                        if 1 <= idx <= 7:
-                            if idx <= stage_index:
-                                row['Voltage'] = '-4.5'
-                            else:
-                                row['Voltage'] = '-2.5'
-                    except ValueError:
-                        pass
-                rows.append(row)
-        
-        with open(self.dac_config_path, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
+        if stage_index == self._last_dac_stage and self._mtime(self.dac_config_path) == self._last_dac_mtime:
+            print(f"{self.dac_config_path} already set for Stage {stage_index}")
+            return
+
+        if self._dac_offsets and self._file_key(self.dac_config_path) == self._dac_offsets_key:
+            self._patch_dac_voltages(stage_index)
+        else:
+            self._rewrite_dac_config(stage_index)
+        self._last_dac_stage = stage_index
+        self._last_dac_mtime = self._mtime(self.dac_config_path)
         print(f"Updated {self.dac_config_path} for Stage {stage_index}")
 
+    def _patch_dac_voltages(self, stage_index):
+        """
+        Overwrites the DAC1..DAC7 Voltage fields in place.
+        Both voltages are 4 bytes, so the file layout never shifts.
+        """
+        path = self.dac_config_path
+        before = os.stat(path).st_mtime_ns
+        # Plain writes (not an mmap view) so the OS updates the mtime itself
+        with open(path, 'r+b') as f:
+            for idx, offset in sorted(self._dac_offsets.items(), key=lambda kv: kv[1]):
+                f.seek(offset)
+                f.write(DAC_ACTIVE_VOLTAGE if idx <= stage_index else DAC_IDLE_VOLTAGE)
+        # The size never changes, so the mtime alone has to show the change to
+        # the (mtime, size) keyed caches; move it on if the write landed in the
+        # same timestamp tick
+        st = os.stat(path)
+        if st.st_mtime_ns <= before:
+            os.utime(path, ns=(st.st_atime_ns, before + MTIME_BUMP_NS))
+        utils.invalidate_config_cache(path)
+        self._dac_offsets_key = self._file_key(path)
+
+    def _rewrite_dac_config(self, stage_index):
+        """
+        Rewrites the whole file in one pass and records the Voltage field
+        offsets so later stages can patch them in place.
+        """
+        with open(self.dac_config_path, 'rb') as f:
+            header = f.readline()
+            lines = f.readlines()
+
+        # Cache column positions from the header instead of building a dict per row
+        columns = header.rstrip(b'\r\n').split(b',')
+        ch_col = columns.index(b'Channel')
+        volt_col = columns.index(b'Voltage')
+
+        out = [header]
+        offsets = {}
+        pos = len(header)
+        for line in lines:
+            body = line.rstrip(b'\r\n')
+            parts = body.split(b',')
+            ch_name = parts[ch_col] if len(parts) > max(ch_col, volt_col) else b''
+            # Check if channel is DAC1..DAC32 (format DACx)
+            digits = ch_name[3:] if ch_name.startswith(b'DAC') else b''
+            # Logic: DAC 1 to i = -4.5V
+            # Note: SRS says "DAC 1...i". Assuming 1-based index for logic, but file might be 0-based or 1-based.
+            # Looking at previous DAC_Config.csv, it has DAC0, DAC1...
+            # SRS v3.0 Table: Stage 1 -> DAC1.
+            # Let's assume we modify DAC1, DAC2... based on stage.
+            if not digits.isdigit() or not (1 <= int(digits) <= 7):
+                # Untouched rows are written back byte-for-byte
+                out.append(line)
+                pos += len(line)
+                continue
+            idx = int(digits)
+            parts[volt_col] = DAC_ACTIVE_VOLTAGE if idx <= stage_index else DAC_IDLE_VOLTAGE
+            new_line = b','.join(parts) + line[len(body):]
+            offsets[idx] = pos + sum(len(p) + 1 for p in parts[:volt_col])
+            out.append(new_line)
+            pos += len(new_line)
+
+        # Write to a temp file and swap it in so a failed write never truncates the config
+        tmp_path = self.dac_config_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.writelines(out)
+        os.replace(tmp_path, self.dac_config_path)
+        utils.invalidate_config_cache(self.dac_config_path)
+        self._dac_offsets = offsets
+        self._dac_offsets_key = self._file_key(self.dac_config_path)
+
     def modify_power_config(self, stage_index):
         """
         Modifies Power_Config.yaml.
@@ -62,35 +173,136 @@ class ConfigManager:
             print(f"Warning: {self.power_config_path} not found.")
             return
 
-        with open(self.power_config_path, 'r', encoding='utf-8') as f:
-            data = yaml.safe_load(f) or []
-            
         # Formula from SRS v3.0: 1.6 + (0.3 * i)
         # Stage 1 (i=1) -> 1.9V
         # Stage 7 (i=7) -> 3.7V
         target_v = 1.6 + (0.3 * stage_index)
-        
-        updated = False
-        for item in data:
-            if item.get('instrument') == 'DP1' and int(item.get('channel')) == 2:
-                item['voltage'] = round(target_v, 2)
-                updated = True
-                
-        if not updated:
-            print("Warning: DP1 CH2 not found in Power config.")
-            
-        with open(self.power_config_path, 'w', encoding='utf-8') as f:
-            yaml.dump(data, f, sort_keys=False)
+        new_v = round(target_v, 2)
+
+        if new_v == self._last_power_voltage and self._mtime(self.power_config_path) == self._last_power_mtime:
+            print(f"{self.power_config_path} already set: DP1 CH2 -> {target_v:.2f}V")
+            return
+
+        if self._power_text is not None and self._file_key(self.power_config_path) == self._power_text_key:
+            text = self._power_text
+        else:
+            with open(self.power_config_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+
+        # Fast path: edit the single voltage field in place. Fall back to a full
+        # YAML round-trip if the file layout doesn't match (e.g. hand-edited).
+        text, count = DP1_CH2_VOLTAGE_RE.subn(lambda m: m.group(1) + str(new_v), text)
+        updated = count > 0
+        if updated:
+            with open(self.power_config_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            self._power_text = text
+            self._power_text_key = self._file_key(self.power_config_path)
+        else:
+            self._power_text = None
+            data = yaml.load(text, Loader=SafeLoader) or []
+            for item in data:
+                if item.get('instrument') == 'DP1' and int(item.get('channel')) == 2:
+                    item['voltage'] = new_v
+                    updated = True
+
+            if not updated:
+                print("Warning: DP1 CH2 not found in Power config.")
+
+            with open(self.power_config_path, 'w', encoding='utf-8') as f:
+                yaml.dump(data, f, Dumper=SafeDumper, sort_keys=False)
+        self._last_power_voltage = new_v if updated else None
+        self._last_power_mtime = self._mtime(self.power_config_path)
         print(f"Updated {self.power_config_path}: DP1 CH2 -> {target_v:.2f}V")
 
+    @staticmethod
+    def _stage_dac_index(ch_name):
+        """
+        Returns x for a DAC1..DAC7 channel name ("DACx"), else None.
+        """
+        digits = ch_name[3:] if ch_name.startswith('DAC') else ''
+        if digits.isdigit() and 1 <= int(digits) <= 7:
+            return int(digits)
+        return None
+
+    def build_stage_configs(self, stages):
+        """
+        In-memory equivalent of modify_dac_config + modify_power_config.
+        Returns {stage: (dac_rows, power_items)} without writing either file:
+        dac_rows as read by csv.DictReader, power_items as parsed from YAML.
+        Each file is parsed once; an entry is None if its file is missing.
+        Untouched rows are shared between stages, treat the result as read-only.
+        """
+        dac_rows = None
+        if os.path.exists(self.dac_config_path):
+            with open(self.dac_config_path, 'r', encoding='utf-8', newline='') as f:
+                dac_rows = list(csv.DictReader(f))
+        else:
+            print(f"Warning: {self.dac_config_path} not found.")
+
+        power_items = None
+        if os.path.exists(self.power_config_path):
+            with open(self.power_config_path, 'r', encoding='utf-8') as f:
+                power_items = yaml.load(f, Loader=SafeLoader) or []
+        else:
+            print(f"Warning: {self.power_config_path} not found.")
+
+        active = DAC_ACTIVE_VOLTAGE.decode('ascii')
+        idle = DAC_IDLE_VOLTAGE.decode('ascii')
+        configs = {}
+        for stage in stages:
+            stage_dac = None
+            if dac_rows is not None:
+                stage_dac = []
+                for row in dac_rows:
+                    idx = self._stage_dac_index(row.get('Channel') or '')
+                    if idx is not None:
+                        row = dict(row, Voltage=active if idx <= stage else idle)
+                    stage_dac.append(row)
+
+            stage_power = None
+            if power_items is not None:
+                stage_power = copy.deepcopy(power_items)
+                new_v = round(1.6 + (0.3 * stage), 2)
+                for item in stage_power:
+                    if item.get('instrument') == 'DP1' and int(item.get('channel')) == 2:
+                        item['voltage'] = new_v
+            configs[stage] = (stage_dac, stage_power)
+        return configs
+
     def get_power_limits(self):
         """
-        Reads Power_limit_config.yaml and returns the list of limits.
+        Reads Power_limit_config.yaml and returns the limits as a tuple of
+        (instrument, channel, min_current, max_current). Rows with an invalid
+        channel or current are skipped.
+        The parsed tuple is cached and only re-read when the file's mtime changes.
         """
-        limit_path = "Power_limit_config.yaml"
-        if not os.path.exists(limit_path):
+        limit_path = self.limit_path
+        try:
+            mtime = os.stat(limit_path).st_mtime_ns
+        except OSError:
             print(f"Warning: {limit_path} not found.")
-            return []
-            
+            self._limits_cache = None
+            self._limits_mtime = None
+            return ()
+
+        if self._limits_cache is not None and mtime == self._limits_mtime:
+            return self._limits_cache
+
         with open(limit_path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f) or []
+            data = yaml.load(f, Loader=SafeLoader) or []
+
+        limits = []
+        for d in data:
+            try:
+                limits.append((
+                    d.get('instrument'),
+                    int(d.get('channel')),
+                    float(d.get('min_current', -math.inf)),
+                    float(d.get('max_current', math.inf)),
+                ))
+            except (TypeError, ValueError):
+                continue
+        self._limits_cache = tuple(limits)
+        self._limits_mtime = mtime
+        return self._limits_cache
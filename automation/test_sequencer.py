@@ -1,11 +1,25 @@
 import math
 import os
+import sys
 from PySide6.QtCore import QObject, QTimer
 from .config_manager import ConfigManager
 
 # Safety Limit for Input Amplitude (Volts)
 VIN_SAFETY_LIMIT = 0.5
 
+# Delay before the next stage (ms). Workers emit finished_signal from inside run(),
+# so a short hop through the event loop lets the previous QThread return first.
+SETTLE_MS = 200
+
+# Linearity source used by every stage (DAC CH10 as per SRS)
+STAGE_DAC_ALIAS = "DAC1"
+STAGE_DAC_CHANNEL = "10"
+
+# Fixed header/footer of the current-limit table printed by check_current_limits
+LIMITS_TABLE_RULE = "-" * 70 + "\n"
+LIMITS_TABLE_HEADER = (f"{'Instrument':<10} {'Channel':<8} {'Measured':<10} {'Limit (Min, Max)':<20} {'Status':<10}\n"
+                       + LIMITS_TABLE_RULE)
+
 class AutoTestSequencer(QObject):
     def __init__(self, window):
         super().__init__()
@@ -14,6 +28,11 @@ class AutoTestSequencer(QObject):
         self.current_stage = 1
         self.max_stages = 7
         self.result_folder = "results/dc_linearity_result"
+        self.image_folder = "image"
+
+        # Newest mtime already tagged per folder; older files are never candidates again
+        self._last_result_mtime = 0.0
+        self._last_image_mtime = 0.0
         
         # Gain table from SRS v3.0
         # Stage: Gain(dB)
@@ -27,6 +46,12 @@ class AutoTestSequencer(QObject):
             7: 8
         }
 
+        # Every stage's scan parameters are fixed by gain_map, so compute them once
+        self._scan_params = {i: self._compute_scan_params(i) for i in self.gain_map}
+        # ...and so are the strings pushed into the GUI line edits
+        self._scan_strings = {i: (f"{start_v:.4f}", f"{step_v:.6f}", str(points))
+                              for i, (start_v, step_v, points) in self._scan_params.items()}
+
     def start(self):
         print("=== Starting Automated Test Sequence (SRS v3.0) ===")
         
@@ -78,10 +103,11 @@ class AutoTestSequencer(QObject):
             QTimer.singleShot(5000, self.run_stage)
 
     def on_power_on_finished(self):
+        w = self.window
         print("Power On Sequence Completed.")
         try:
-            self.window.pwr_worker.finished_signal.disconnect(self.on_power_on_finished)
-        except:
+            w.pwr_worker.finished_signal.disconnect(self.on_power_on_finished)
+        except (RuntimeError, TypeError):
             pass
         
         # REQ-04: Current Check
@@ -89,7 +115,7 @@ class AutoTestSequencer(QObject):
         self.check_current_limits()
 
         # Start Loop Test (REQ-03 -> 3.3)
-        QTimer.singleShot(2000, self.run_stage)
+        QTimer.singleShot(SETTLE_MS, self.run_stage)
 
     def check_current_limits(self):
         """
@@ -97,29 +123,23 @@ class AutoTestSequencer(QObject):
         Checks if they are within limits.
         Logs FAIL if not, but does not stop (as per user request).
         """
+        im = self.window.inst_mgr
         limits = self.config_manager.get_power_limits()
         if not limits:
             print("No limits found in Power_limit_config.yaml.")
             return
 
         all_pass = True
-        print(f"{'Instrument':<10} {'Channel':<8} {'Measured':<10} {'Limit (Min, Max)':<20} {'Status':<10}")
-        print("-" * 70)
+        # Rows are collected and written once at the end instead of one print per row
+        rows_out = [LIMITS_TABLE_HEADER]
 
-        for limit in limits:
-            inst_name = limit.get('instrument')
-            try:
-                channel = int(limit.get('channel'))
-            except:
-                continue
-                
-            min_c = float(limit.get('min_current', -float('inf')))
-            max_c = float(limit.get('max_current', float('inf')))
+        for inst_name, channel, min_c, max_c in limits:
+            limit_str = "(" + str(min_c) + ", " + str(max_c) + ")"
 
             # Get Instrument
-            inst = self.window.inst_mgr.get_instrument(inst_name)
+            inst = im.get_instrument(inst_name)
             if not inst or not inst.connected:
-                print(f"{inst_name:<10} {channel:<8} {'N/A':<10} {f'({min_c}, {max_c})':<20} {'N/A (Not Connected)':<10}")
+                rows_out.append(f"{inst_name:<10} {channel:<8} {'N/A':<10} {limit_str:<20} {'N/A (Not Connected)':<10}\n")
                 continue
 
             try:
@@ -132,26 +152,29 @@ class AutoTestSequencer(QObject):
                     status = "FAIL"
                     all_pass = False
                 
-                print(f"{inst_name:<10} {channel:<8} {measured:<10.4f} {f'({min_c}, {max_c})':<20} {status:<10}")
+                rows_out.append(f"{inst_name:<10} {channel:<8} {measured:<10.4f} {limit_str:<20} {status:<10}\n")
 
             except Exception as e:
-                print(f"{inst_name:<10} {channel:<8} {'Error':<10} {f'({min_c}, {max_c})':<20} {str(e):<10}")
+                rows_out.append(f"{inst_name:<10} {channel:<8} {'Error':<10} {limit_str:<20} {str(e):<10}\n")
         
-        print("-" * 70)
+        rows_out.append(LIMITS_TABLE_RULE)
         if not all_pass:
-            print("Warning: Some current checks FAILED. Continuing test as per configuration.")
+            rows_out.append("Warning: Some current checks FAILED. Continuing test as per configuration.\n")
         else:
-            print("All current checks PASSED.")
+            rows_out.append("All current checks PASSED.\n")
+        sys.stdout.write("".join(rows_out))
 
 
     def run_stage(self):
+        w = self.window
+        cm = self.config_manager
         i = self.current_stage
         print(f"\n--- Running Stage {i}/{self.max_stages} ---")
         
         # 3.3.2 Dynamic Config Modification (REQ-06, REQ-07)
         try:
-            self.config_manager.modify_dac_config(i)
-            self.config_manager.modify_power_config(i)
+            cm.modify_dac_config(i)
+            cm.modify_power_config(i)
         except Exception as e:
             print(f"Error modifying configs: {e}")
             self.abort_sequence()
@@ -159,10 +182,10 @@ class AutoTestSequencer(QObject):
 
         # 3.3.2 Hardware Refresh (REQ-08)
         print("Loading DAC Configuration...")
-        self.window.apply_dac_config()
+        w.apply_dac_config()
         
         print("Loading Power Configuration...")
-        self.window.apply_power_config()
+        w.apply_power_config()
         
         # 3.3.3 Calculate Scan Parameters (REQ-09, REQ-10)
         try:
@@ -173,27 +196,18 @@ class AutoTestSequencer(QObject):
             self.abort_sequence()
             return
         
-        # Set GUI Controls
-        self.window.txt_start.setText(f"{start_v:.4f}")
-        self.window.txt_step.setText(f"{step_v:.6f}")
-        self.window.txt_points.setText(str(points))
-        
-        # Ensure correct source selection (DAC)
-        if not self.window.rb_dac.isChecked():
-            self.window.rb_dac.setChecked(True)
-            
+        # Set GUI Controls, ensure correct source selection (DAC)
         # Set Channels (Fixed DAC CH10 as per SRS v2.0? SRS v3.0 doesn't explicitly mention CH10 in text but implies consistency)
         # SRS v3.0 REQ-11 says "Control DAC/DG". Assuming DAC CH10 from previous context.
-        self.window.combo_dac_sel_lin.setCurrentText("DAC1") 
-        self.window.txt_dac_ch.setText("10")
+        w.apply_linearity_params(*self.scan_strings(i), STAGE_DAC_ALIAS, STAGE_DAC_CHANNEL)
         
         # 3.3.4 Execute Test (REQ-11)
         print("Starting Linearity Test...")
-        self.window.start_linearity_test()
+        w.start_linearity_test()
         
         # Wait for Completion
-        if hasattr(self.window, 'lin_worker') and self.window.lin_worker:
-            self.window.lin_worker.finished_signal.connect(self.on_stage_finished)
+        if hasattr(w, 'lin_worker') and w.lin_worker:
+            w.lin_worker.finished_signal.connect(self.on_stage_finished)
         else:
             print("Error: LinearityWorker not found.")
             self.abort_sequence()
@@ -201,6 +215,25 @@ class AutoTestSequencer(QObject):
     def calculate_scan_params(self, stage_index):
         """
         REQ-09, REQ-10
+        Returns the precomputed (start_v, step_v, points) for the stage.
+        """
+        params = self._scan_params.get(stage_index)
+        if params is None:
+            params = self._compute_scan_params(stage_index)
+        return params
+
+    def scan_strings(self, stage_index):
+        """
+        Returns the (start, step, points) strings shown in the GUI for the stage.
+        """
+        strings = self._scan_strings.get(stage_index)
+        if strings is None:
+            start_v, step_v, points = self.calculate_scan_params(stage_index)
+            strings = (f"{start_v:.4f}", f"{step_v:.6f}", str(points))
+        return strings
+
+    def _compute_scan_params(self, stage_index):
+        """
         Target Output = +/- 0.25V
         G_lin = 10^(Gain_dB / 20)
         V_in_amp = 0.25 / G_lin
@@ -224,11 +257,12 @@ class AutoTestSequencer(QObject):
         return start_v, step_v, points
 
     def on_stage_finished(self):
+        w = self.window
         print(f"Stage {self.current_stage} Analysis Completed.")
         
         try:
-            self.window.lin_worker.finished_signal.disconnect(self.on_stage_finished)
-        except:
+            w.lin_worker.finished_signal.disconnect(self.on_stage_finished)
+        except (RuntimeError, TypeError):
             pass
         
         # REQ-12: Save Data (Rename with Stage)
@@ -237,7 +271,7 @@ class AutoTestSequencer(QObject):
         # Proceed
         self.current_stage += 1
         if self.current_stage <= self.max_stages:
-            QTimer.singleShot(2000, self.run_stage)
+            QTimer.singleShot(SETTLE_MS, self.run_stage)
         else:
             self.finish_sequence()
 
@@ -259,32 +293,58 @@ class AutoTestSequencer(QObject):
         Handles both .txt results and .png plots.
         """
         # 1. Handle Text Result
-        if os.path.exists(self.result_folder):
-            files = [os.path.join(self.result_folder, f) for f in os.listdir(self.result_folder) if f.endswith('.txt')]
-            if files:
-                latest_file = max(files, key=os.path.getctime)
-                dirname, basename = os.path.split(latest_file)
-                if not basename.startswith("Stage"):
-                    new_name = f"Stage{self.current_stage}_{basename}"
-                    new_path = os.path.join(dirname, new_name)
-                    try:
-                        os.rename(latest_file, new_path)
-                        print(f"Result saved as: {new_name}")
-                    except Exception as e:
-                        print(f"Error renaming result file: {e}")
-
-        # 2. Handle Image Plot
-        image_folder = "image"
-        if os.path.exists(image_folder):
-            files = [os.path.join(image_folder, f) for f in os.listdir(image_folder) if f.endswith('.png')]
-            if files:
-                latest_file = max(files, key=os.path.getctime)
-                dirname, basename = os.path.split(latest_file)
-                if not basename.startswith("Stage"):
-                    new_name = f"Stage{self.current_stage}_{basename}"
-                    new_path = os.path.join(dirname, new_name)
-                    try:
-                        os.rename(latest_file, new_path)
-                        print(f"Plot saved as: {new_name}")
-                    except Exception as e:
-                        print(f"Error renaming plot file: {e}")
+        self._last_result_mtime = self._tag_latest_file(
+            self.result_folder, '.txt', self._last_result_mtime, "Result")
+
+        # 2. Handle Image Plot (written in the background; make sure it is on disk)
+        wait = getattr(self.window, 'wait_for_plot_saves', None)
+        if wait:
+            wait()
+        self._last_image_mtime = self._tag_latest_file(
+            self.image_folder, '.png', self._last_image_mtime, "Plot")
+
+    def _tag_latest_file(self, folder, ext, last_mtime, label):
+        """
+        Renames the newest `ext` file in `folder` newer than `last_mtime`.
+        Returns the updated mtime watermark.
+        """
+        latest, latest_mtime = _latest_with_ext(folder, os.fsencode(ext), last_mtime)
+        if latest is None:
+            return latest_mtime
+
+        basename = os.fsdecode(latest.name)
+        if basename.startswith("Stage"):
+            return latest_mtime
+
+        new_name = f"Stage{self.current_stage}_{basename}"
+        new_path = os.path.join(folder, new_name)
+        try:
+            os.rename(os.fsdecode(latest.path), new_path)
+            print(f"{label} saved as: {new_name}")
+        except Exception as e:
+            print(f"Error renaming {label.lower()} file: {e}")
+        return latest_mtime
+
+
+def _latest_with_ext(folder, suffix, watermark):
+    """
+    Returns (entry, mtime) for the newest file in `folder` ending with the
+    bytes `suffix` and newer than `watermark`; entry is None if there is none.
+    Scanning with a bytes path compares raw names without decoding each one.
+    """
+    best = None
+    best_m = watermark
+    try:
+        it = os.scandir(os.fsencode(folder))
+    except OSError:
+        return best, best_m
+    # scandir entries cache their stat result, so this is one pass over the folder
+    with it:
+        for e in it:
+            if not e.name.endswith(suffix):
+                continue
+            st = e.stat()
+            if st.st_mtime > best_m:
+                best_m = st.st_mtime
+                best = e
+    return best, best_m
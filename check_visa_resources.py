@@ -1,21 +1,39 @@
+import asyncio
 import pyvisa
 
+# 单个仪器查询 IDN 的超时时间 (ms)
+IDN_TIMEOUT_MS = 1500
+
+def _query_idn(rm, res):
+    try:
+        # 尝试打开资源获取 IDN，确认连接性
+        # 注意：如果 NI MAX 打开，这里可能会失败
+        with rm.open_resource(res) as inst:
+            inst.timeout = IDN_TIMEOUT_MS
+            return res, f"IDN: {inst.query('*IDN?').strip()}"
+    except Exception as e:
+        return res, f"Error querying IDN: {e}"
+
+async def _probe(rm, res):
+    # 阻塞的 VISA 调用放到线程中执行，事件循环可同时等待所有仪器
+    return await asyncio.to_thread(_query_idn, rm, res)
+
+async def _probe_all(rm, resources):
+    # 按完成顺序输出，总耗时取决于最慢的一个而非所有仪器之和
+    for coro in asyncio.as_completed([_probe(rm, res) for res in resources]):
+        res, info = await coro
+        print(f"  - {res}")
+        print(f"    {info}")
+
 def list_resources():
     try:
         rm = pyvisa.ResourceManager()
         print(f"VISA Backend: {rm.visalib}")
         resources = rm.list_resources()
         print("\nAvailable VISA Resources:")
-        for res in resources:
-            print(f"  - {res}")
-            try:
-                # 尝试打开资源获取 IDN，确认连接性
-                # 注意：如果 NI MAX 打开，这里可能会失败
-                with rm.open_resource(res) as inst:
-                    print(f"    IDN: {inst.query('*IDN?').strip()}")
-            except Exception as e:
-                print(f"    Error querying IDN: {e}")
-                
+        if resources:
+            asyncio.run(_probe_all(rm, resources))
+
     except Exception as e:
         print(f"Error initializing VISA: {e}")
         print("Please ensure NI-VISA or PyVISA-py is installed.")
@@ -1,64 +1,81 @@
 # 文件名: config_loader.py (已更新)
 import os
+import numpy as np
 
-def _calculate_gear(gears):
-    """将4个通道的档位值合并为一个16位的整数码。"""
-    gear_to_code_map = {2.5: 14, 5.0: 9, 10.0: 10, 20.0: 12}
-    if len(gears) != 4:
-        raise ValueError("CalculateGear函数需要一个包含4个档位值的列表。")
-    code0 = gear_to_code_map.get(gears[0], 0)
-    code1 = gear_to_code_map.get(gears[1], 0)
-    code2 = gear_to_code_map.get(gears[2], 0)
-    code3 = gear_to_code_map.get(gears[3], 0)
-    return (code3 << 12) | (code2 << 8) | (code1 << 4) | code0
+# 档位码查找表：以 档位*2 为下标 (2.5->5, 5->10, 10->20, 20->40)，其余位置为0
+_GEAR_CODES = [0] * 41
+_GEAR_CODES[5] = 14
+_GEAR_CODES[10] = 9
+_GEAR_CODES[20] = 10
+_GEAR_CODES[40] = 12
+_GEAR_CODES_ARR = np.array(_GEAR_CODES, dtype=np.int64)
 
-def _voltage_to_dac_code(voltage, gear):
-    """将电压值转换为16位DAC码值。"""
-    if gear == 0: return 0
-    voltage = max(-gear, min(gear, voltage))
-    return round((gear + voltage) * 65535 / (2 * gear))
+# 预先生成命令前缀：每4通道一组的档位寄存器命令，以及32个通道的输出命令
+_DAC_PREFIXES = [f"DAC{0 if i < 16 else 1:02d} {13 - (i % 16) // 4} " for i in range(0, 32, 4)]
+_OUT_PREFIXES = [f"OUTPUT {ch} " for ch in range(32)]
+
+# 找不到配置文件时使用的默认32通道配置（只读模板，返回给调用方前逐项浅拷贝）
+_DEFAULT_CONFIG = tuple({'gear': 2.5, 'voltage': 0.0} for _ in range(32))
+
+def _gear_codes_vec(gears):
+    """向量化计算每个通道的4位档位码，非法档位为0。"""
+    k = gears * 2
+    ki = np.clip(np.nan_to_num(k), 0, 40).astype(np.int64)
+    valid = (ki == k)
+    return np.where(valid, _GEAR_CODES_ARR[ki], 0)
+
+def _dac_codes_vec(gears, volts):
+    """向量化计算所有通道的16位DAC码值：电压先限制在 ±档位 内，档位为0的通道码值为0。"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        clipped = np.maximum(-gears, np.minimum(gears, volts))
+        codes = np.rint((gears + clipped) * 65535 / (2 * gears))
+    return np.where(gears == 0, 0, codes).astype(np.int64)
 
 def load_config_data(filepath):
     """从文件加载配置，并返回结构化的数据列表。"""
     if not os.path.exists(filepath):
         # 如果文件不存在，返回一个默认的32通道配置
         print(f"警告：找不到 {os.path.basename(filepath)}，将使用默认值。")
-        return [{'gear': 2.5, 'voltage': 0.0} for _ in range(32)]
+        return [dict(item) for item in _DEFAULT_CONFIG]
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        lines = f.readlines()[1:]
+    # 逐行流式解析，按索引填入预分配的列表，避免 readlines() 和切片的额外拷贝
+    config_data = [None] * 32
+    count = 0
+    with open(filepath, 'r', encoding='utf-8', buffering=65536) as f:
+        next(f, None)  # 跳过表头
+        for i, line in enumerate(f, start=2):
+            parts = line.split()
+            if len(parts) == 3:
+                try:
+                    item = {
+                        'gear': float(parts[1]),
+                        'voltage': float(parts[2])
+                    }
+                except (ValueError, IndexError):
+                    raise Exception(f"错误：文件第 {i} 行格式不正确: '{line.strip()}'")
+                if count < 32:
+                    config_data[count] = item
+                count += 1
     
-    config_data = []
-    for i, line in enumerate(lines):
-        parts = line.strip().split()
-        if len(parts) == 3:
-            try:
-                config_data.append({
-                    'gear': float(parts[1]),
-                    'voltage': float(parts[2])
-                })
-            except (ValueError, IndexError):
-                raise Exception(f"错误：文件第 {i+2} 行格式不正确: '{line.strip()}'")
-    
-    if len(config_data) != 32:
-        raise Exception(f"错误：配置文件应包含32行有效数据，实际找到 {len(config_data)} 行。")
+    if count != 32:
+        raise Exception(f"错误：配置文件应包含32行有效数据，实际找到 {count} 行。")
     return config_data
 
 def generate_full_config_commands(config_data):
     """根据完整的32通道数据，生成所有配置命令。"""
-    for i in range(0, 32, 4):
-        chunk = config_data[i : i+4]
-        dac_chip_num = 0 if i < 16 else 1
-        register_addr = 13 - (i % 16) // 4
+    gears = np.array([item['gear'] for item in config_data], dtype=np.float64)
+    volts = np.array([item['voltage'] for item in config_data], dtype=np.float64)
+
+    # 一次性算出32个DAC码值和8个档位寄存器值
+    dac_codes = _dac_codes_vec(gears, volts).tolist()
+    codes = _gear_codes_vec(gears)
+    gear_values = ((codes[3::4] << 12) | (codes[2::4] << 8) | (codes[1::4] << 4) | codes[0::4]).tolist()
 
-        gears_in_chunk = [item['gear'] for item in chunk]
-        calculated_gear_value = _calculate_gear(gears_in_chunk)
-        yield (f"DAC{dac_chip_num:02d} {register_addr} {calculated_gear_value};", 0.1)
+    for group in range(8):
+        yield (_DAC_PREFIXES[group] + str(gear_values[group]) + ";", 0.1)
 
-        for j, item in enumerate(chunk):
-            channel = i + j
-            dac_code = _voltage_to_dac_code(item['voltage'], item['gear'])
-            yield (f"OUTPUT {channel} {dac_code};", 0.1)
+        for channel in range(group * 4, group * 4 + 4):
+            yield (_OUT_PREFIXES[channel] + str(dac_codes[channel]) + ";", 0.1)
 
 def load_visa_address(filepath):
     """从VISAID.txt文件读取VISA地址"""
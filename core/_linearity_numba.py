@@ -0,0 +1,84 @@
+"""
+Optional numba kernel for utils.calculate_linearity_metrics.
+linearity_kernel is None when numba is not installed; callers fall back to NumPy.
+The kernel expects NaN-free input (its max reductions skip NaN); callers route
+NaN data to NumPy.
+"""
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _linearity_kernel(x, y):
+    """
+    Fit, INL, DNL and the max/min reductions in two passes over x/y.
+    x, y: contiguous float64 arrays with len >= 2.
+    Returns (gain, offset, inl, dnl, lsb_ideal, nonlinearity_pct, max_inl, max_dnl).
+    """
+    n = x.size
+
+    # Linear fit on mean-centered x (same result as the NumPy path)
+    x_mean = 0.0
+    y_mean = 0.0
+    for i in range(n):
+        x_mean += x[i]
+        y_mean += y[i]
+    x_mean /= n
+    y_mean /= n
+
+    sxx = 0.0
+    sxy = 0.0
+    for i in range(n):
+        dx = x[i] - x_mean
+        sxx += dx * dx
+        sxy += dx * y[i]
+    if sxx > 0:
+        gain = sxy / sxx
+        offset = y_mean - gain * x_mean
+    else:
+        scale = y_mean / (x_mean * x_mean + 1.0)
+        gain = x_mean * scale
+        offset = scale
+
+    # Expected output step: mean input step * gain
+    lsb_ideal = (x[n - 1] - x[0]) / (n - 1) * gain
+    if lsb_ideal == 0:
+        lsb_ideal = 1e-9
+
+    inl = np.empty(n)
+    dnl = np.empty(n)
+    dnl[0] = 0.0
+    y_min = y[0]
+    y_max = y[0]
+    max_dev = 0.0
+    max_dnl = 0.0
+    for i in range(n):
+        yi = y[i]
+        resid = yi - (gain * x[i] + offset)
+        inl[i] = resid / lsb_ideal
+        dev = abs(resid)
+        if dev > max_dev:
+            max_dev = dev
+        if yi < y_min:
+            y_min = yi
+        if yi > y_max:
+            y_max = yi
+        if i > 0:
+            d = (yi - y[i - 1]) / lsb_ideal - 1.0
+            dnl[i] = d
+            if abs(d) > max_dnl:
+                max_dnl = abs(d)
+
+    fsr = y_max - y_min
+    nonlinearity_pct = 0.0
+    if fsr > 0:
+        nonlinearity_pct = (max_dev / fsr) * 100.0
+    max_inl = max_dev / abs(lsb_ideal)
+
+    return gain, offset, inl, dnl, lsb_ideal, nonlinearity_pct, max_inl, max_dnl
+
+
+linearity_kernel = njit(cache=True)(_linearity_kernel) if njit else None
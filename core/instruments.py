@@ -1,5 +1,7 @@
+import threading
 import time
-import random
+
+import numpy as np
 
 # Try importing real libraries, fall back to None if missing
 try:
@@ -12,21 +14,60 @@ try:
 except ImportError:
     serial = None
 
+# VISA session settings applied on open (known-safe for the Rigol DP/DM/DG)
+VISA_CHUNK_SIZE = 1024 * 1024
+VISA_TERMINATION = '\n'
+VISA_TIMEOUT_MS = 3000
+
+# Simulated readings are drawn in blocks of SIM_SAMPLES (power of two, used as a mask)
+SIM_SAMPLES = 1 << 16
+# Set to True to print every simulated per-point set/measure
+SIM_VERBOSE = False
+
+def _sim_samples(low, high):
+    return np.random.default_rng().uniform(low, high, size=SIM_SAMPLES).tolist()
+
 class InstrumentManager:
     def __init__(self, simulation_mode=True):
         self._simulation_mode = simulation_mode
-        self.rm = None
+        self._rm = None
+        self._rm_failed = False
+        # Power-up connects supplies from several threads at once
+        self._rm_lock = threading.Lock()
         self.instruments = {} # Registry: {alias: instrument_instance}
-        
-        # Always try to initialize ResourceManager if pyvisa is available
-        # This allows switching to real mode later even if started in sim mode
-        if pyvisa:
-            try:
-                self.rm = pyvisa.ResourceManager()
-            except Exception as e:
-                print(f"Error initializing VISA ResourceManager: {e}")
-                # If RM fails, we might want to enforce sim mode, but let's just log for now
-                pass
+
+    @property
+    def rm(self):
+        """
+        VISA ResourceManager, created on first use. Creating it scans for VISA
+        backends, so sim-only sessions never pay for it; switching to real mode
+        later still works because instruments resolve it on connect().
+        """
+        if self._rm is None and pyvisa and not self._rm_failed:
+            with self._rm_lock:
+                if self._rm is None and not self._rm_failed:
+                    try:
+                        self._rm = pyvisa.ResourceManager()
+                    except Exception as e:
+                        print(f"Error initializing VISA ResourceManager: {e}")
+                        # Don't retry (and re-print) on every connect
+                        self._rm_failed = True
+        return self._rm
+
+    def _get_rm(self):
+        return self.rm
+
+    @staticmethod
+    def _configure_visa(inst):
+        """
+        Sets chunk size, termination and timeout explicitly so queries are
+        read in one call instead of several small driver reads.
+        """
+        inst.chunk_size = VISA_CHUNK_SIZE
+        inst.read_termination = VISA_TERMINATION
+        inst.write_termination = VISA_TERMINATION
+        inst.timeout = VISA_TIMEOUT_MS
+        return inst
 
     @property
     def simulation_mode(self):
@@ -47,13 +88,13 @@ class InstrumentManager:
         inst = None
         # Pass current simulation_mode
         if inst_type == 'DP':
-            inst = PowerSupply(address, self.rm, self._simulation_mode)
+            inst = PowerSupply(address, self._get_rm, self._simulation_mode)
         elif inst_type == 'DAC':
             inst = DAC(address, 9600, self._simulation_mode) # Assuming 9600 default
         elif inst_type == 'DM':
-            inst = Multimeter(address, self.rm, self._simulation_mode)
+            inst = Multimeter(address, self._get_rm, self._simulation_mode)
         elif inst_type == 'DG':
-            inst = SignalGenerator(address, self.rm, self._simulation_mode)
+            inst = SignalGenerator(address, self._get_rm, self._simulation_mode)
         
         if inst:
             self.instruments[alias] = inst
@@ -75,24 +116,32 @@ class InstrumentManager:
 
     # Legacy/Direct access helpers (optional, but keeping for compatibility if needed)
     def get_power_supply(self, address):
-        return PowerSupply(address, self.rm, self.simulation_mode)
+        return PowerSupply(address, self._get_rm, self.simulation_mode)
 
     def get_dac(self, port, baudrate=9600):
         return DAC(port, baudrate, self.simulation_mode)
 
     def get_multimeter(self, address):
-        return Multimeter(address, self.rm, self.simulation_mode)
+        return Multimeter(address, self._get_rm, self.simulation_mode)
     
     def get_signal_generator(self, address):
-        return SignalGenerator(address, self.rm, self.simulation_mode)
+        return SignalGenerator(address, self._get_rm, self.simulation_mode)
 
 class PowerSupply:
-    def __init__(self, address, resource_manager, simulation_mode):
+    SUPPORTS_DC_INIT = False
+    # register_instrument type string; also the Device Manager tree group
+    TYPE_KEY = "DP"
+
+    def __init__(self, address, rm_resolver, simulation_mode):
         self.address = address
         self.simulation_mode = simulation_mode
         self.inst = None
         self.connected = False
-        self.rm = resource_manager
+        # Callable returning the ResourceManager; only resolved on a real connect
+        self._rm_resolver = rm_resolver
+        # Simulated readings, filled on first simulated measurement
+        self._sim_buf = None
+        self._sim_i = 0
 
     def connect(self):
         if self.simulation_mode:
@@ -100,13 +149,14 @@ class PowerSupply:
             print(f"[SIM] Connected to Power Supply at {self.address}")
             return True
         
-        if not self.rm:
+        rm = self._rm_resolver()
+        if not rm:
             print("VISA Resource Manager not available.")
             return False
 
         try:
-            if self.rm:
-                self.inst = self.rm.open_resource(self.address)
+            if rm:
+                self.inst = InstrumentManager._configure_visa(rm.open_resource(self.address))
                 self.connected = True
                 return True
         except Exception as e:
@@ -132,14 +182,12 @@ class PowerSupply:
 
         if self.connected and self.inst:
             try:
-                # Setting OVP
-                self.inst.write(f":OUTPut:OVP:VALue CH{channel},{ovp:.4f}")
-                self.inst.write(f":OUTPut:OVP CH{channel},ON")
-                
-                # Setting OCP
-                self.inst.write(f":OUTPut:OCP:VALue CH{channel},{ocp:.4f}")
-                self.inst.write(f":OUTPut:OCP CH{channel},ON")
-                
+                # Set OVP and OCP in a single compound SCPI message (one bus transaction)
+                self.inst.write(f":OUTPut:OVP:VALue CH{channel},{ovp:.4f};"
+                                f":OUTPut:OVP CH{channel},ON;"
+                                f":OUTPut:OCP:VALue CH{channel},{ocp:.4f};"
+                                f":OUTPut:OCP CH{channel},ON")
+
             except Exception as e:
                 print(f"Error setting DP protection: {e}")
 
@@ -165,8 +213,12 @@ class PowerSupply:
 
     def measure_current(self, channel):
         if self.simulation_mode:
-            val = random.uniform(0.1, 0.8)
-            print(f"[SIM] DP Measure Current CH{channel}: {val:.3f}A")
+            if self._sim_buf is None:
+                self._sim_buf = _sim_samples(0.1, 0.8)
+            val = self._sim_buf[self._sim_i]
+            self._sim_i = (self._sim_i + 1) & (SIM_SAMPLES - 1)
+            if SIM_VERBOSE:
+                print(f"[SIM] DP Measure Current CH{channel}: {val:.3f}A")
             return val
         
         if self.connected and self.inst:
@@ -178,18 +230,55 @@ class PowerSupply:
                 return 0.0
         return 0.0
 
+    def measure_currents(self, channels):
+        """
+        Measures several channels with one compound SCPI query; the replies come
+        back ';'-separated in one read. Falls back to per-channel queries if the
+        query fails or the reply doesn't parse.
+        Returns (values, error): the floats in channel order, and the exception
+        that caused the fallback (None if the compound query worked).
+        """
+        if self.simulation_mode or len(channels) < 2:
+            return [self.measure_current(ch) for ch in channels], None
+
+        if not (self.connected and self.inst):
+            return [0.0] * len(channels), None
+
+        try:
+            reply = self.inst.query(";".join(f":MEASure:CURRent? CH{ch}" for ch in channels))
+            values = [float(v) for v in reply.split(";")]
+            if len(values) == len(channels):
+                return values, None
+            error = ValueError(f"expected {len(channels)} values, got {len(values)}: {reply!r}")
+        except Exception as e:
+            error = e
+        # Drop any replies of the compound query still queued, so the
+        # per-channel queries don't read them
+        try:
+            self.inst.clear()
+        except Exception:
+            pass
+        return [self.measure_current(ch) for ch in channels], error
+
     def close(self):
         if self.inst:
             self.inst.close()
         self.connected = False
 
 class DAC:
+    SUPPORTS_DC_INIT = False
+    # register_instrument type string; also the Device Manager tree group
+    TYPE_KEY = "DAC"
+
     def __init__(self, port, baudrate, simulation_mode):
         self.port = port
         self.baudrate = baudrate
         self.simulation_mode = simulation_mode
         self.ser = None
         self.connected = False
+        # Pending set_output commands, written to the port in one go by flush()
+        self._tx_buf = bytearray()
+        self._tx_limit = 4096
 
     def connect(self):
         if self.simulation_mode:
@@ -212,8 +301,42 @@ class DAC:
         return False
 
     def set_output(self, channel_idx, dac_code):
+        """
+        Queues an output command. It is sent once the buffer fills up, on
+        flush(), or before the next raw command; call flush() when the value
+        must be on the output now.
+        """
         cmd = f"OUTPUT {channel_idx} {dac_code};"
-        self.send_raw_command(cmd)
+        if not (self.connected and self.ser):
+            self.send_raw_command(cmd)
+            return
+        self._tx_buf += cmd.encode('ascii')
+        self._tx_buf.append(0x0A)
+        if len(self._tx_buf) >= self._tx_limit:
+            self.flush()
+
+    def set_outputs(self, pairs):
+        """
+        Queues OUTPUT commands for several (channel_idx, dac_code) pairs at once,
+        see set_output.
+        """
+        if not (self.connected and self.ser):
+            for channel_idx, dac_code in pairs:
+                self.send_raw_command(f"OUTPUT {channel_idx} {dac_code};")
+            return
+        self._tx_buf += "".join([f"OUTPUT {ch} {code};\n" for ch, code in pairs]).encode('ascii')
+        if len(self._tx_buf) >= self._tx_limit:
+            self.flush()
+
+    def flush(self):
+        if not self._tx_buf:
+            return
+        if self.connected and self.ser:
+            try:
+                self.ser.write(self._tx_buf)
+            except Exception as e:
+                print(f"Error sending to DAC: {e}")
+        self._tx_buf.clear()
 
     def send_raw_command(self, cmd):
         if self.simulation_mode: # Although simulation_mode property was removed, we check connection logic
@@ -224,6 +347,8 @@ class DAC:
              return
 
         if self.connected and self.ser:
+            # Send queued set_output commands first to keep command order
+            self.flush()
             try:
                 # print(f"Sending DAC: {cmd}")
                 self.ser.write(cmd.encode('ascii') + b'\n')
@@ -232,16 +357,25 @@ class DAC:
 
     def close(self):
         if self.ser:
+            self.flush()
             self.ser.close()
         self.connected = False
 
 class Multimeter:
-    def __init__(self, address, resource_manager, simulation_mode):
+    SUPPORTS_DC_INIT = False
+    # register_instrument type string; also the Device Manager tree group
+    TYPE_KEY = "DM"
+
+    def __init__(self, address, rm_resolver, simulation_mode):
         self.address = address
         self.simulation_mode = simulation_mode
         self.inst = None
         self.connected = False
-        self.rm = resource_manager
+        # Callable returning the ResourceManager; only resolved on a real connect
+        self._rm_resolver = rm_resolver
+        # Simulated readings, filled on first simulated measurement
+        self._sim_buf = None
+        self._sim_i = 0
 
     def connect(self):
         if self.simulation_mode:
@@ -249,13 +383,14 @@ class Multimeter:
             print(f"[SIM] Connected to Multimeter at {self.address}")
             return True
         
-        if not self.rm:
+        rm = self._rm_resolver()
+        if not rm:
             print("VISA Resource Manager not available.")
             return False
 
         try:
-            if self.rm:
-                self.inst = self.rm.open_resource(self.address)
+            if rm:
+                self.inst = InstrumentManager._configure_visa(rm.open_resource(self.address))
                 self.connected = True
                 return True
         except Exception as e:
@@ -264,7 +399,10 @@ class Multimeter:
 
     def measure_voltage(self):
         if self.simulation_mode:
-            val = random.uniform(-5, 5)
+            if self._sim_buf is None:
+                self._sim_buf = _sim_samples(-5, 5)
+            val = self._sim_buf[self._sim_i]
+            self._sim_i = (self._sim_i + 1) & (SIM_SAMPLES - 1)
             return val
         
         if self.connected and self.inst:
@@ -282,12 +420,18 @@ class Multimeter:
         self.connected = False
 
 class SignalGenerator:
-    def __init__(self, address, resource_manager, simulation_mode):
+    # Has initialize_dc_mode()
+    SUPPORTS_DC_INIT = True
+    # register_instrument type string; also the Device Manager tree group
+    TYPE_KEY = "DG"
+
+    def __init__(self, address, rm_resolver, simulation_mode):
         self.address = address
         self.simulation_mode = simulation_mode
         self.inst = None
         self.connected = False
-        self.rm = resource_manager
+        # Callable returning the ResourceManager; only resolved on a real connect
+        self._rm_resolver = rm_resolver
 
     def connect(self):
         if self.simulation_mode:
@@ -295,13 +439,14 @@ class SignalGenerator:
             print(f"[SIM] Connected to Signal Generator at {self.address}")
             return True
         
-        if not self.rm:
+        rm = self._rm_resolver()
+        if not rm:
             print("VISA Resource Manager not available.")
             return False
 
         try:
-            if self.rm:
-                self.inst = self.rm.open_resource(self.address)
+            if rm:
+                self.inst = InstrumentManager._configure_visa(rm.open_resource(self.address))
                 self.connected = True
                 return True
         except Exception as e:
@@ -318,17 +463,19 @@ class SignalGenerator:
                 # Follows configure_dg4202_for_sweep.py
                 self.inst.write("*RST")
                 time.sleep(0.1)
-                self.inst.write(f"SOUR{channel}:FUNC DC")
-                self.inst.write(f"SOUR{channel}:VOLT 0")
-                self.inst.write(f"SOUR{channel}:VOLT:OFFS 0")
-                self.inst.write(f"OUTP{channel}:LOAD 50")
-                self.inst.write(f"OUTP{channel} ON")
+                # Remaining setup goes out as one compound SCPI message
+                self.inst.write(f":SOUR{channel}:FUNC DC;"
+                                f":SOUR{channel}:VOLT 0;"
+                                f":SOUR{channel}:VOLT:OFFS 0;"
+                                f":OUTP{channel}:LOAD 50;"
+                                f":OUTP{channel} ON")
             except Exception as e:
                 print(f"Error initializing DG: {e}")
 
     def set_dc_voltage(self, voltage, channel=1):
         if self.simulation_mode:
-            print(f"[SIM] DG Set DC CH{channel}: {voltage}V")
+            if SIM_VERBOSE:
+                print(f"[SIM] DG Set DC CH{channel}: {voltage}V")
             return
         
         if self.connected and self.inst:
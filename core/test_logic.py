@@ -1,27 +1,105 @@
 import time
 import os
-from datetime import datetime
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 from . import utils
 
+# Upper bound on power supplies driven concurrently during Power ON
+MAX_POWER_WORKERS = 8
+
+# DAC range used for linearity sweeps, [-10V, +10V]
+DAC_SWEEP_RANGE = 10.0
+
+# Settle time between setting a linearity point and measuring it (s)
+SETTLE_TIME = 0.2
+# Power rail settle before the current reading / gap between rails on power-down (s)
+POWER_ON_SETTLE = 1.0
+POWER_OFF_INTERVAL = 0.5
+# Settle after switching the DG to DC mode (s)
+DG_INIT_SETTLE = 1.0
+
+# Granularity of the stop-request check while waiting for a deadline (s)
+STOP_POLL_INTERVAL = 0.02
+
+# DAC config range groups: (first channel, channel indices, range command prefix).
+# 4 channels per group; channels 0-15 are on chip 0, 16-31 on chip 1, and each
+# chip's groups use registers 13 down to 10 (logic from config_loader.py)
+_DAC_CHUNKS = tuple(
+    (i, (i, i + 1, i + 2, i + 3), f"DAC{0 if i < 16 else 1:02d} {13 - (i % 16) // 4} ")
+    for i in range(0, 32, 4)
+)
+
+# Log lines are handed to log_callback in batches: at most every LOG_FLUSH_INTERVAL
+# seconds, or as soon as LOG_FLUSH_MAX lines are pending
+LOG_FLUSH_INTERVAL = 0.016
+LOG_FLUSH_MAX = 64
+
+def wait_until(deadline, context):
+    """
+    Sleeps until time.monotonic() reaches deadline, checking for a stop request.
+    Returns False if the wait was interrupted by a stop request.
+    """
+    # Nothing else is logged while waiting, so hand over what is pending now
+    context.flush()
+    while True:
+        if context.check_stop():
+            return False
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return True
+        time.sleep(min(remaining, STOP_POLL_INTERVAL))
+
+def _set_and_arm(setter, idx):
+    """
+    Sets sweep point `idx` and returns the deadline until which it must settle.
+    """
+    setter(idx)
+    return time.monotonic() + SETTLE_TIME
+
 class TestContext:
     """
     Helper class to handle callbacks for logging and progress updates.
     Allows logic to be used with or without GUI.
+    Log lines are buffered and delivered to log_callback newline-joined in
+    batches; call flush() when the run ends.
     """
     def __init__(self, log_callback=None, progress_callback=None):
         self.log_callback = log_callback
         self.progress_callback = progress_callback
         self.should_stop = False
+        self._log_buf = deque()
+        self._log_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._last_progress = None
 
     def log(self, message):
-        if self.log_callback:
-            self.log_callback(message)
-        else:
+        if not self.log_callback:
             print(f"[LOG] {message}")
+            return
+        with self._log_lock:
+            self._log_buf.append(message)
+            due = (len(self._log_buf) >= LOG_FLUSH_MAX
+                   or time.monotonic() - self._last_flush >= LOG_FLUSH_INTERVAL)
+        if due:
+            self.flush()
+
+    def flush(self):
+        # Several threads may log into one context (Power ON); the buffer is
+        # swapped out under the lock, and the callback runs under it too so
+        # batches are delivered in order
+        with self._log_lock:
+            self._last_flush = time.monotonic()
+            if not self._log_buf:
+                return
+            batch, self._log_buf = self._log_buf, deque()
+            self.log_callback("\n".join(batch))
 
     def report_progress(self, value):
-        if self.progress_callback:
+        # Progress is an integer percentage; only changes are worth reporting
+        if self.progress_callback and value != self._last_progress:
+            self._last_progress = value
             self.progress_callback(value)
 
     def check_stop(self):
@@ -34,6 +112,9 @@ class PowerTestLogic:
     """
     Encapsulates the logic for Power ON/OFF sequences.
     """
+    RESULT_FOLDER = "results/power_on_result"
+    RESULT_PREFIX = f"{RESULT_FOLDER}/Power_on_result_"
+
     def __init__(self, instrument_manager):
         self.inst_mgr = instrument_manager
 
@@ -49,59 +130,31 @@ class PowerTestLogic:
         if mode == "OFF":
             configs = list(reversed(configs))
 
-        limits = []
+        limits = {}
         if mode == "ON":
-            limits = utils.load_yaml_config(limit_file)
+            limits = self._index_limits(utils.load_yaml_config(limit_file))
 
         results = []
         
         # 2. Execute Sequence
-        for item in configs:
-            if context.check_stop():
-                context.log("Sequence stopped by user.")
-                break
-            
-            try:
-                dp_name = item['instrument']
-                ch = item['channel']
-                volt = float(item['voltage'])
-                curr = float(item['current'])
-            except KeyError as e:
-                context.log(f"Skipping invalid config item {item}: Missing key {e}")
-                continue
-                
-            # Find instrument by Alias (DPName)
-            dp = self.inst_mgr.get_instrument(dp_name)
-            if not dp:
-                context.log(f"Error: Instrument '{dp_name}' not found in registry.")
-                continue
-            
-            if not dp.connected:
-                if not dp.connect():
-                    context.log(f"Error: Failed to connect to '{dp_name}'")
+        if mode == "ON":
+            results = self._run_power_on(context, configs, limits)
+        else: # OFF
+            # Power-down order matters, so OFF stays strictly sequential
+            resolved = {}
+            for item in configs:
+                if context.check_stop():
+                    context.log("Sequence stopped by user.")
+                    break
+
+                rail = self._resolve_rail(item, context, resolved)
+                if not rail:
                     continue
-            
-            context.log(f"Processing {dp_name} CH{ch}: Set {volt}V, {curr}A")
-            
-            if mode == "ON":
-                dp.set_channel(ch, volt, curr)
-                
-                dp.output_on(ch)
-                time.sleep(1) # Wait for stability
-                
-                meas_curr = dp.measure_current(ch)
-                
-                # Check limits
-                status = self._check_limit(dp_name, ch, meas_curr, limits)
-                
-                msg = f"CH{ch} Current: {meas_curr:.4f}A ({status})"
-                context.log(msg)
-                results.append(f"{dp_name}, {ch}, {meas_curr:.4f}, {status}")
-                
-            else: # OFF
+                dp_name, dp, ch, volt, curr = rail
+
                 dp.output_off(ch)
                 context.log(f"CH{ch} OFF")
-                time.sleep(0.5)
+                wait_until(time.monotonic() + POWER_OFF_INTERVAL, context)
 
         # 3. Save Results (only for ON)
         if mode == "ON":
@@ -109,27 +162,134 @@ class PowerTestLogic:
             
         return True
 
-    def _check_limit(self, dp_name, ch, measured_val, limits):
+    def _run_power_on(self, context, configs, limits):
+        """
+        Powers up the rails grouped by instrument. Each power supply's rails run
+        in config order on one thread; different supplies are driven concurrently.
+        Returns the result rows in config order.
+        """
+        groups = {}
+        for idx, item in enumerate(configs):
+            key = item.get('instrument') if isinstance(item, dict) else None
+            groups.setdefault(key, []).append((idx, item))
+
+        rows = {}
+        lock = threading.Lock()
+
+        def run_group(group):
+            resolved = {}
+            for idx, item in group:
+                if context.check_stop():
+                    return
+                rail = self._resolve_rail(item, context, resolved)
+                if not rail:
+                    continue
+                row = self._power_on_rail(context, *rail, limits)
+                if row is None:
+                    return
+                with lock:
+                    rows[idx] = row
+
+        with ThreadPoolExecutor(max_workers=min(len(groups), MAX_POWER_WORKERS)) as pool:
+            futures = [pool.submit(run_group, group) for group in groups.values()]
+            for future in as_completed(futures):
+                future.result()
+
+        if context.check_stop():
+            context.log("Sequence stopped by user.")
+        return [rows[idx] for idx in sorted(rows)]
+
+    def _resolve_rail(self, item, context, resolved):
+        """
+        Parses a config item and returns (dp_name, dp, ch, volt, curr) with the
+        instrument connected, or None if the item has to be skipped.
+        `resolved` caches alias -> connected instrument (or None) for the run,
+        so each supply is looked up and connected only once.
+        """
+        try:
+            dp_name = item['instrument']
+            ch = item['channel']
+            volt = float(item['voltage'])
+            curr = float(item['current'])
+        except KeyError as e:
+            context.log(f"Skipping invalid config item {item}: Missing key {e}")
+            return None
+
+        if dp_name in resolved:
+            dp = resolved[dp_name]
+            if dp is None:
+                context.log(f"Skipping {dp_name} CH{ch}: instrument unavailable")
+                return None
+        else:
+            dp = resolved[dp_name] = self._connect_instrument(dp_name, context)
+            if dp is None:
+                return None
+        
+        context.log(f"Processing {dp_name} CH{ch}: Set {volt}V, {curr}A")
+        return dp_name, dp, ch, volt, curr
+
+    def _connect_instrument(self, dp_name, context):
+        # Find instrument by Alias (DPName)
+        dp = self.inst_mgr.get_instrument(dp_name)
+        if not dp:
+            context.log(f"Error: Instrument '{dp_name}' not found in registry.")
+            return None
+        
+        if not dp.connected:
+            if not dp.connect():
+                context.log(f"Error: Failed to connect to '{dp_name}'")
+                return None
+        return dp
+
+    def _power_on_rail(self, context, dp_name, dp, ch, volt, curr, limits):
+        dp.set_channel(ch, volt, curr)
+        
+        dp.output_on(ch)
+        # Wait for stability; a reading taken before it would be meaningless
+        if not wait_until(time.monotonic() + POWER_ON_SETTLE, context):
+            return None
+        
+        meas_curr = dp.measure_current(ch)
+        
+        # Check limits
+        status = self._check_limit(dp_name, ch, meas_curr, limits)
+        
+        msg = f"CH{ch} Current: {meas_curr:.4f}A ({status})"
+        context.log(msg)
+        return f"{dp_name}, {ch}, {meas_curr:.4f}, {status}"
+
+    @staticmethod
+    def _index_limits(limits):
+        """
+        Builds {(instrument, channel): (min_current, max_current)} from the limit list.
+        The first entry for a given rail wins, matching the old linear scan.
+        """
+        index = {}
         for lim in limits:
-            # Limit Format: Dict
-            if lim.get('instrument') == dp_name and lim.get('channel') == ch:
-                min_c = float(lim.get('min_current', -float('inf')))
-                max_c = float(lim.get('max_current', float('inf')))
-                if min_c <= measured_val <= max_c:
-                    return "PASS"
-                else:
-                    return "FAIL"
-        return "NO_LIMIT"
+            try:
+                key = (lim.get('instrument'), lim.get('channel'))
+                rng = (float(lim.get('min_current', -float('inf'))),
+                       float(lim.get('max_current', float('inf'))))
+            except (AttributeError, TypeError, ValueError):
+                continue
+            index.setdefault(key, rng)
+        return index
+
+    def _check_limit(self, dp_name, ch, measured_val, limits):
+        rng = limits.get((dp_name, ch))
+        if rng is None:
+            return "NO_LIMIT"
+        return "PASS" if rng[0] <= measured_val <= rng[1] else "FAIL"
 
     def _save_results(self, results, context):
-        folder = "results/power_on_result"
+        folder = self.RESULT_FOLDER
         os.makedirs(folder, exist_ok=True)
-        fname = f"{folder}/Power_on_result_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        fname = f"{self.RESULT_PREFIX}{utils.ts_suffix()}.txt"
         try:
-            with open(fname, 'w') as f:
-                f.write("DP Name, Channel, Measured Current, Status\n")
-                for r in results:
-                    f.write(r + "\n")
+            # Assemble the whole file and hand it to one write() call
+            payload = "DP Name, Channel, Measured Current, Status\n" + "".join(r + "\n" for r in results)
+            with open(fname, 'w', buffering=1 << 20) as f:
+                f.write(payload)
             context.log(f"Results saved to {fname}")
         except Exception as e:
             context.log(f"Error saving results: {e}")
@@ -138,6 +298,9 @@ class LinearityTestLogic:
     """
     Encapsulates the logic for DC Linearity Testing.
     """
+    RESULT_FOLDER = "results/dc_linearity_result"
+    RESULT_PREFIX = f"{RESULT_FOLDER}/dc_linearity_result_"
+
     def __init__(self, instrument_manager):
         self.inst_mgr = instrument_manager
 
@@ -168,10 +331,11 @@ class LinearityTestLogic:
             # Assuming channel 1 for now or we could add a DG Channel field
             # The reference script uses CH1.
             dg_ch = 1 
-            if hasattr(source_inst, 'initialize_dc_mode'):
+            if getattr(source_inst, 'SUPPORTS_DC_INIT', False):
                  context.log(f"Initializing {dg_alias} to DC mode...")
                  source_inst.initialize_dc_mode(dg_ch)
-                 time.sleep(1)
+                 # A stop request here is picked up by the sweep loop below
+                 wait_until(time.monotonic() + DG_INIT_SETTLE, context)
 
         # 2. Generate Test Points
         try:
@@ -181,29 +345,47 @@ class LinearityTestLogic:
             context.log(f"Error generating steps: {e}")
             return None
         
-        input_vals = []
-        measured_vals = []
+        # Source-specific dispatch is decided once; the loop just calls setter(idx)
+        setter = self._make_setter(source_inst, source_type, dac_ch, steps)
+        
         total_steps = len(steps)
+        input_vals = steps
+        measured_vals = np.empty(total_steps)
+        count = 0
+        measure = dm.measure_voltage
         
         # 3. Execution Loop
-        for idx, v in enumerate(steps):
-            if context.check_stop():
-                context.log("Test stopped by user.")
-                break
-            
-            # Set Source
-            self._set_source_value(source_inst, source_type, dac_ch, v)
-            
-            time.sleep(0.2) # Settle time
-            
-            # Measure
-            meas = dm.measure_voltage()
-            
-            input_vals.append(v)
-            measured_vals.append(meas)
-            
-            context.log(f"Set: {v:.4f}V, Meas: {meas:.4f}V")
-            context.report_progress(int((idx + 1) / total_steps * 100))
+        # Source writes run on their own thread: the next point is set right after
+        # the current one is measured, and the logging/progress work for point i
+        # overlaps that write. The settle timer starts once the write has completed,
+        # so every measurement still happens a full SETTLE_TIME after its own set.
+        with ThreadPoolExecutor(max_workers=1) as source_pool:
+            pending_set = None
+            if total_steps and not context.check_stop():
+                pending_set = source_pool.submit(_set_and_arm, setter, 0)
+
+            for idx in range(total_steps):
+                deadline = pending_set.result() if pending_set else 0.0
+                if not wait_until(deadline, context):
+                    context.log("Test stopped by user.")
+                    break
+                
+                # Measure
+                meas = measure()
+                
+                # Set Source for the next point
+                pending_set = None
+                if idx + 1 < total_steps:
+                    pending_set = source_pool.submit(_set_and_arm, setter, idx + 1)
+                
+                measured_vals[idx] = meas
+                count = idx + 1
+                
+                context.log(f"Set: {steps[idx]:.4f}V, Meas: {meas:.4f}V")
+                context.report_progress(int((idx + 1) / total_steps * 100))
+
+        input_vals = input_vals[:count]
+        measured_vals = measured_vals[:count]
 
         # 5. Analysis & Save
         metrics = None
@@ -231,23 +413,160 @@ class LinearityTestLogic:
                 return None
         return inst
 
-    def _set_source_value(self, inst, source_type, channel, voltage):
+    @staticmethod
+    def _dac_codes(steps):
+        """
+        DAC codes for the [-10V, +10V] sweep range as a list of Python ints.
+        """
+        return utils.calculate_dac_codes(DAC_SWEEP_RANGE, steps).tolist()
+
+    def _make_setter(self, inst, source_type, channel, steps):
+        """
+        Returns a callable setting the source to sweep point `idx`.
+        DAC codes for the whole sweep are precomputed in one pass.
+        """
         if source_type == "DAC":
             # Assuming 10V range for calculation as per previous logic
-            code = utils.calculate_dac_code("10", voltage)
-            inst.set_output(channel, code)
-        else:
-            # DG
-            # channel argument here comes from dac_ch which might not be relevant for DG if we assume CH1
-            # But let's pass 1 for DG
-            inst.set_dc_voltage(voltage, channel=1)
+            codes = self._dac_codes(steps)
+            set_output = inst.set_output
+            flush = inst.flush
+
+            def set_dac(idx):
+                set_output(channel, codes[idx])
+                # The point has to be on the output before its settle/measure
+                flush()
+            return set_dac
+
+        # DG
+        # channel argument here comes from dac_ch which might not be relevant for DG if we assume CH1
+        # But let's pass 1 for DG
+        values = steps.tolist()
+        set_dc_voltage = inst.set_dc_voltage
+
+        def set_dg(idx):
+            set_dc_voltage(values[idx], channel=1)
+        return set_dg
 
     def _save_results(self, input_vals, measured_vals, metrics, context):
-        folder = "results/dc_linearity_result"
+        folder = self.RESULT_FOLDER
         os.makedirs(folder, exist_ok=True)
-        fname = f"{folder}/dc_linearity_result_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        fname = f"{self.RESULT_PREFIX}{utils.ts_suffix()}.txt"
         try:
             utils.save_linearity_results(fname, input_vals, measured_vals, metrics)
             context.log(f"Results saved to {fname}")
         except Exception as e:
             context.log(f"Error saving results: {e}")
+
+class ConfigApplyLogic:
+    """
+    Applies DAC_Config.csv / Power_Config.yaml to the instruments.
+    """
+    DAC_CONFIG_FILE = "DAC_Config.csv"
+    POWER_CONFIG_FILE = "Power_Config.yaml"
+
+    def __init__(self, instrument_manager):
+        self.inst_mgr = instrument_manager
+
+    def apply_dac_config(self, context: TestContext, dac_alias, configs=None):
+        """
+        Applies DAC_Config.csv, or the given rows (same format) if passed.
+        """
+        context.log("Applying DAC Configuration...")
+        if configs is None:
+            # Memoized by mtime, already parsed into the channel dictionary
+            dac_data = utils.load_dac_channels(self.DAC_CONFIG_FILE)
+        else:
+            dac_data = utils.parse_dac_rows(configs)
+        if not dac_data:
+            context.log(f"Error: {self.DAC_CONFIG_FILE} not found or empty.")
+            return
+
+        dac = self.inst_mgr.get_instrument(dac_alias)
+        
+        if not dac:
+            context.log(f"Error: DAC '{dac_alias}' not found in registry. Please add it in Device Manager.")
+            return
+        
+        if not dac.connected:
+            if not dac.connect():
+                context.log(f"Error: Could not connect to DAC '{dac_alias}'")
+                return
+            
+        # Process in chunks of 4 channels (Total 32 channels: 0-31)
+        for i, chunk_indices, range_prefix in _DAC_CHUNKS:
+            # Prepare data for this chunk
+            chunk_ranges = []
+            
+            # Check if any channel in this chunk is present in the config file
+            # If so, we process the whole chunk (filling missing ones with defaults)
+            # If the whole chunk is missing from config, we skip it
+            chunk_has_data = any(idx in dac_data for idx in chunk_indices)
+            if not chunk_has_data:
+                continue
+
+            for idx in chunk_indices:
+                if idx in dac_data:
+                    chunk_ranges.append(dac_data[idx]['range'])
+                else:
+                    chunk_ranges.append(2.5) # Default range
+
+            # 1. Calculate and Send Range/Gear Command (see _DAC_CHUNKS)
+            gear_code = utils.calculate_gear_code(chunk_ranges)
+            
+            cmd_range = f"{range_prefix}{gear_code};"
+            context.log(f"Set Range Group {i}-{i+3}: {cmd_range}")
+            dac.send_raw_command(cmd_range)
+            time.sleep(0.1)
+            
+            # 2. Send Output Commands for channels in this chunk, queued together
+            # (written ahead of the next range command or by the final flush)
+            pairs = []
+            for j, idx in enumerate(chunk_indices):
+                if idx in dac_data:
+                    v_range = chunk_ranges[j]
+                    target_v = dac_data[idx]['voltage']
+                    
+                    code = utils.calculate_dac_code(str(v_range), target_v)
+                    context.log(f"Set DAC{idx} ({v_range}V) to {target_v}V -> Code {code}")
+                    pairs.append((idx, code))
+            dac.set_outputs(pairs)
+        
+        dac.flush()
+        context.log("DAC Configuration Completed.")
+
+    def apply_power_config(self, context: TestContext, configs=None):
+        """
+        Applies Power_Config.yaml, or the given items (same format) if passed.
+        """
+        context.log("Applying Power Configuration...")
+        if configs is None:
+            # load_yaml_config is memoized by mtime itself
+            configs = utils.load_yaml_config(self.POWER_CONFIG_FILE)
+        if not configs:
+            context.log(f"Error: {self.POWER_CONFIG_FILE} not found.")
+            return
+            
+        # Logic needs to find DP by name in config, so we just ensure they are connected
+        # Or we iterate configs and find the DP in registry
+        
+        for item in configs:
+            try:
+                dp_name = item['instrument']
+                ch = item['channel']
+                volt = float(item['voltage'])
+                curr = float(item['current'])
+                
+                dp = self.inst_mgr.get_instrument(dp_name)
+                if not dp:
+                    context.log(f"Error: Power Supply '{dp_name}' not found in registry.")
+                    continue
+                    
+                if not dp.connected:
+                    dp.connect()
+                
+                context.log(f"Set {dp_name} CH{ch}: {volt}V, {curr}A")
+                dp.set_channel(ch, volt, curr)
+            except Exception as e:
+                context.log(f"Error setting DP: {e}")
+        
+        context.log("Power Configuration Completed.")
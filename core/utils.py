@@ -1,31 +1,89 @@
 import numpy as np
 import os
+import functools
 from datetime import datetime
 import yaml
 import csv
 
+from ._linearity_numba import linearity_kernel
+
+# Prefer the libyaml C backend, fall back to the pure-Python loader
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# Parsed config cache: (loader name, path) -> ((mtime_ns, size), result)
+_CFG_CACHE = {}
+
+def _mtime_cached(func):
+    """
+    Memoizes a config loader per file path.
+    The cached result is reused until the file's mtime or size changes.
+    Callers must treat the returned data as read-only.
+    """
+    @functools.wraps(func)
+    def wrapper(filepath):
+        key = (func.__name__, filepath)
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            _CFG_CACHE.pop(key, None)
+            return func(filepath)
+
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = _CFG_CACHE.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        result = func(filepath)
+        _CFG_CACHE[key] = (stamp, result)
+        return result
+    return wrapper
+
+def invalidate_config_cache(filepath):
+    """
+    Drops every memoized result for filepath, for writers whose change the
+    (mtime, size) key might miss (same size, same mtime tick).
+    """
+    target = os.path.abspath(filepath)
+    for key in [k for k in _CFG_CACHE if os.path.abspath(k[1]) == target]:
+        del _CFG_CACHE[key]
+
+def ts_suffix():
+    """
+    Timestamp for result file names: YYYYmmdd_HHMMSS_ffffff (microseconds),
+    taken from one clock read, so two saves within the same second don't
+    collide and the names sort in time order.
+    """
+    return datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+
+# Range (V) -> 4-bit gear code, see calculate_gear_code
+_GEAR_TO_CODE = {2.5: 14, 5.0: 9, 10.0: 10, 20.0: 12}
+_GEAR_SHIFTS = (0, 4, 8, 12)
+
 def calculate_gear_code(gears):
     """
     Calculates the 16-bit register value for 4 channels' ranges.
     gears: list of 4 float values [range0, range1, range2, range3]
     Mapping: 2.5->14, 5.0->9, 10.0->10, 20.0->12
     """
-    gear_to_code_map = {2.5: 14, 5.0: 9, 10.0: 10, 20.0: 12}
     if len(gears) != 4:
         return 0
     
-    code0 = gear_to_code_map.get(float(gears[0]), 0)
-    code1 = gear_to_code_map.get(float(gears[1]), 0)
-    code2 = gear_to_code_map.get(float(gears[2]), 0)
-    code3 = gear_to_code_map.get(float(gears[3]), 0)
-    
-    return (code3 << 12) | (code2 << 8) | (code1 << 4) | code0
+    # 4-bit code per channel, channel 0 in the lowest nibble
+    code = 0
+    for shift, gear in zip(_GEAR_SHIFTS, gears):
+        code |= _GEAR_TO_CODE.get(float(gear), 0) << shift
+    return code
 
+@functools.lru_cache(maxsize=8192)
 def calculate_dac_code(voltage_range_str, desired_voltage):
     """
     Calculates the 16-bit DAC control code.
     voltage_range_str: '2.5', '5', '10', '20' (representing range)
     Let's assume Range N means [-N, N] for simplicity unless specified otherwise.
+    Pure and memoized; arguments must be hashable.
     """
     try:
         v_range = float(voltage_range_str)
@@ -58,6 +116,27 @@ def calculate_dac_code(voltage_range_str, desired_voltage):
     except ValueError:
         return 0
 
+def calculate_dac_codes(voltage_range_str, desired_voltages):
+    """
+    Array form of calculate_dac_code for a whole sweep: one NumPy pass instead
+    of a call per point. Returns a uint16 array; invalid input gives 0 codes.
+    """
+    v = np.asarray(desired_voltages, dtype=np.float64)
+    try:
+        v_range = float(voltage_range_str)
+    except ValueError:
+        return np.zeros(v.shape, dtype=np.uint16)
+
+    voltage_span = 2 * v_range
+    if voltage_span == 0:
+        return np.zeros(v.shape, dtype=np.uint16)
+
+    codes = np.trunc(((v + v_range) / voltage_span) * (2**16 - 1))
+    # NaN maps to 0 like the scalar version's ValueError path
+    codes = np.nan_to_num(codes, nan=0.0)
+    return np.clip(codes, 0, 65535).astype(np.uint16)
+
+@_mtime_cached
 def load_yaml_config(filepath):
     """
     Parses YAML config files.
@@ -67,7 +146,7 @@ def load_yaml_config(filepath):
         return []
     with open(filepath, 'r', encoding='utf-8') as f:
         try:
-            return yaml.safe_load(f) or []
+            return yaml.load(f, Loader=SafeLoader) or []
         except yaml.YAMLError as e:
             print(f"Error parsing YAML {filepath}: {e}")
             return []
@@ -77,15 +156,41 @@ def load_csv_config(filepath):
     Parses CSV config files.
     Returns a list of dictionaries.
     """
-    data = []
     if not os.path.exists(filepath):
-        return data
+        return []
     with open(filepath, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            data.append(row)
-    return data
+        return list(csv.DictReader(f))
+
+def parse_dac_rows(configs):
+    """
+    Pre-processes DAC_Config.csv rows into {channel index: {'range', 'voltage'}};
+    malformed rows are skipped.
+    """
+    dac_data = {}
+    for item in configs or ():
+        try:
+            ch_name = item['Channel']
+            ch_idx = int(ch_name.replace("DAC", ""))
+            dac_data[ch_idx] = {
+                'range': float(item['Range']),
+                'voltage': float(item['Voltage'])
+            }
+        except Exception:
+            continue
+    return dac_data
 
+@_mtime_cached
+def load_dac_channels(filepath):
+    """
+    Reads a DAC_Config.csv file into the parse_dac_rows dictionary.
+    """
+    return parse_dac_rows(load_csv_config(filepath))
+
+# parse_config_file: comment markers and per-line cleanup table
+_COMMENT_PREFIXES = ('#', '//')
+_CONFIG_LINE_TABLE = str.maketrans({'(': None, ')': None, ',': ' '})
+
+@_mtime_cached
 def parse_config_file(filepath):
     """
     Parses config files.
@@ -99,12 +204,11 @@ def parse_config_file(filepath):
     with open(filepath, 'r', encoding='utf-8') as f:
         for line in f:
             line = line.strip()
-            if not line or line.startswith('#') or line.startswith('//'):
+            if not line or line.startswith(_COMMENT_PREFIXES):
                 continue
             
-            # Remove parentheses if present
-            clean_line = line.replace('(', '').replace(')', '').replace(',', ' ')
-            parts = clean_line.split()
+            # Remove parentheses if present, commas become separators (one pass)
+            parts = line.translate(_CONFIG_LINE_TABLE).split()
             if parts:
                 data.append(parts)
     return data
@@ -121,9 +225,43 @@ def calculate_linearity_metrics(input_values, measured_values):
     if len(x) < 2:
         return None
 
+    # numba kernel when available, same results in a single fused sweep. Its
+    # comparisons skip NaN where NumPy propagates it, so a NaN point (a failed
+    # measurement) always goes through NumPy and shows up as NaN metrics.
+    kernel = linearity_kernel
+    if kernel is None or np.isnan(x).any() or np.isnan(y).any():
+        kernel = _linearity_numpy
+    gain, offset, inl, dnl, lsb_ideal, nonlinearity_pct, max_inl, max_dnl = kernel(x, y)
+
+    return {
+        "gain": gain,
+        "offset": offset,
+        "inl": inl,
+        "dnl": dnl,
+        "lsb_ideal": lsb_ideal,
+        "nonlinearity_pct": nonlinearity_pct,
+        "max_inl": max_inl,
+        "max_dnl": max_dnl
+    }
+
+def _linearity_numpy(x, y):
+    """
+    NumPy implementation of the linearity metrics, see _linearity_numba.
+    """
     # 1. Gain & Offset (Linear Fit: y = Gain * x + Offset)
-    A = np.vstack([x, np.ones(len(x))]).T
-    gain, offset = np.linalg.lstsq(A, y, rcond=None)[0]
+    # Closed-form least squares on mean-centered x (same fit as lstsq, no SVD)
+    x_mean = x.mean()
+    dx = x - x_mean
+    sxx = dx.dot(dx)
+    if sxx > 0:
+        gain = dx.dot(y) / sxx
+        offset = y.mean() - gain * x_mean
+    else:
+        # All inputs identical: minimum-norm solution of gain*x + offset = mean(y),
+        # the same answer lstsq gives for the rank-1 system
+        scale = y.mean() / (x_mean * x_mean + 1.0)
+        gain = x_mean * scale
+        offset = scale
     
     # 2. INL (Integral Non-Linearity)
     # INL = (Vmeas - Vfit) / LSB_ideal
@@ -143,56 +281,51 @@ def calculate_linearity_metrics(input_values, measured_values):
     if lsb_ideal == 0:
         lsb_ideal = 1e-9
 
-    inl = (y - y_fit) / lsb_ideal
+    resid = y - y_fit
+    inl = resid / lsb_ideal
     
     # 3. DNL (Differential Non-Linearity)
     # DNL_i = ( (Vmeas_i - Vmeas_{i-1}) / LSB_ideal ) - 1
-    dnl = np.zeros(len(y))
     # DNL is usually defined for steps. DNL[0] is usually 0 or undefined.
-    for i in range(1, len(y)):
-        step_meas = y[i] - y[i-1]
-        dnl[i] = (step_meas / lsb_ideal) - 1
+    dnl = np.empty_like(y)
+    dnl[0] = 0.0
+    dnl[1:] = np.diff(y) / lsb_ideal - 1.0
         
     # 4. Nonlinearity (% FSR)
     # Max deviation from fit / Full Scale Range
     # FSR = Max(y) - Min(y)
-    fsr = np.max(y) - np.min(y)
-    max_dev = np.max(np.abs(y - y_fit))
+    fsr = np.ptp(y)
+    abs_resid = np.abs(resid, out=resid)
+    max_dev = abs_resid.max()
     
     nonlinearity_pct = 0.0
     if fsr > 0:
         nonlinearity_pct = (max_dev / fsr) * 100.0
 
-    # Max INL / DNL
-    max_inl = np.max(np.abs(inl))
+    # Max INL / DNL (|INL| is |residual| / |LSB|, so no extra pass over inl)
+    max_inl = max_dev / abs(lsb_ideal)
     max_dnl = np.max(np.abs(dnl))
 
-    return {
-        "gain": gain,
-        "offset": offset,
-        "inl": inl,
-        "dnl": dnl,
-        "lsb_ideal": lsb_ideal,
-        "nonlinearity_pct": nonlinearity_pct,
-        "max_inl": max_inl,
-        "max_dnl": max_dnl
-    }
+    return gain, offset, inl, dnl, lsb_ideal, nonlinearity_pct, max_inl, max_dnl
 
 def save_linearity_results(filename, input_vals, measured_vals, metrics):
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write("                --- 传输曲线测试报告 ---\n")
-        f.write(f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        
-        f.write("--- 分析结果 ---\n")
-        f.write(f"{'Gain (Vout/Vin)':<30}: {metrics['gain']:.6f}\n")
-        f.write(f"{'Offset':<30}: {metrics['offset']:.6f} V\n")
-        f.write(f"{'Nonlinearity':<30}: {metrics['nonlinearity_pct']:.4f} % FSR\n")
-        f.write(f"{'Max INL':<30}: {metrics['max_inl']:.6f} LSB\n")
-        f.write(f"{'Max DNL':<30}: {metrics['max_dnl']:.6f} LSB\n\n")
-        
-        f.write("--- 原始数据 ---\n")
-        f.write(f"{'Vin (V)':<16}\t{'Vout (V)':<16}\n")
-        f.write(f"{'-'*8:<16}\t{'-'*8:<16}\n")
-        
-        for i in range(len(input_vals)):
-            f.write(f"{input_vals[i]:<16.4f}\t{measured_vals[i]:<16.6f}\n")
+    # Report header is built in memory; the data block is written by np.savetxt
+    lines = [
+        "                --- 传输曲线测试报告 ---\n",
+        f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n",
+        "--- 分析结果 ---\n",
+        f"{'Gain (Vout/Vin)':<30}: {metrics['gain']:.6f}\n",
+        f"{'Offset':<30}: {metrics['offset']:.6f} V\n",
+        f"{'Nonlinearity':<30}: {metrics['nonlinearity_pct']:.4f} % FSR\n",
+        f"{'Max INL':<30}: {metrics['max_inl']:.6f} LSB\n",
+        f"{'Max DNL':<30}: {metrics['max_dnl']:.6f} LSB\n\n",
+        "--- 原始数据 ---\n",
+        f"{'Vin (V)':<16}\t{'Vout (V)':<16}\n",
+        f"{'-'*8:<16}\t{'-'*8:<16}\n",
+    ]
+    data = np.column_stack([np.asarray(input_vals, dtype=float), np.asarray(measured_vals, dtype=float)])
+
+    with open(filename, 'w', encoding='utf-8', buffering=1 << 20) as f:
+        f.write("".join(lines))
+        # Raw data rows, same layout as f"{v:<16.4f}\t{m:<16.6f}"
+        np.savetxt(f, data, fmt=['%-16.4f', '%-16.6f'], delimiter='\t')
@@ -1,46 +1,93 @@
-import csv
 import os
 from datetime import datetime
 
+# Result CSV columns; per-stage columns for SRS Stage 1-7
+_STAGE_FIELDS = (
+    'Gain_Config', 'Input_Amp', 'Gain', 'Offset',
+    'No_Linearity', 'Max_INL', 'Max_DNL', 'Result'
+)
+FIELDNAMES = (
+    'Test_Time', 'Site_ID', 'Row', 'Col',
+    'Final_Result', 'Fail_Reason',
+    'Power_Current', 'Power_Check_Result'
+) + tuple(f'S{i}_{field}' for i in range(1, 8) for field in _STAGE_FIELDS)
+
+# Header line; rows end with \r\n like csv.writer
+HEADER_LINE = (",".join(FIELDNAMES) + "\r\n").encode('utf-8')
+# Append buffer size; one write per flush
+WRITE_BUFFER = 65536
+_FIELD_SET = frozenset(FIELDNAMES)
+
+
+def _csv_field(value):
+    """
+    Formats one value the way csv.writer (QUOTE_MINIMAL) would.
+    """
+    if value is None:
+        return ''
+    text = value if isinstance(value, str) else str(value)
+    if ',' in text or '"' in text or '\n' in text or '\r' in text:
+        text = '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def _format_row(data):
+    """
+    Returns the encoded CSV line for one result dict; missing fields are empty.
+    """
+    extra = data.keys() - _FIELD_SET
+    if extra:
+        raise ValueError(f"dict contains fields not in fieldnames: {', '.join(map(repr, extra))}")
+    get = data.get
+    return (",".join([_csv_field(get(f)) for f in FIELDNAMES]) + "\r\n").encode('utf-8')
+
+
 class DataManager:
     def __init__(self, result_file="Wafer_Sort_Results.csv"):
         self.result_file = result_file
-        self.fieldnames = [
-            'Test_Time', 'Site_ID', 'Row', 'Col', 
-            'Final_Result', 'Fail_Reason', 
-            'Power_Current', 'Power_Check_Result'
-        ]
-        # Add Stage columns dynamically or fixed? SRS says Stage 1-7.
-        for i in range(1, 8):
-            prefix = f'S{i}'
-            self.fieldnames.extend([
-                f'{prefix}_Gain_Config', 
-                f'{prefix}_Input_Amp',
-                f'{prefix}_Gain',
-                f'{prefix}_Offset',
-                f'{prefix}_No_Linearity',
-                f'{prefix}_Max_INL', 
-                f'{prefix}_Max_DNL', 
-                f'{prefix}_Result'
-            ])
+        self.fieldnames = FIELDNAMES
         
+        # Binary append handle, opened on the first save and kept until close()
+        self._fh = None
         self._init_file()
 
     def _init_file(self):
         if not os.path.exists(self.result_file):
-            with open(self.result_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=self.fieldnames)
-                writer.writeheader()
+            with open(self.result_file, 'wb') as f:
+                f.write(HEADER_LINE)
+
+    def _open(self):
+        # Re-check the header in case the file was removed since __init__
+        self._init_file()
+        self._fh = open(self.result_file, 'ab', buffering=WRITE_BUFFER)
 
     def save_result(self, data):
         """
         data is a dictionary matching fieldnames.
         """
+        self.save_results((data,))
+
+    def save_results(self, records):
+        """
+        Appends several result dictionaries with one write and one flush.
+        """
         # Ensure timestamp if not present
-        if 'Test_Time' not in data:
-            data['Test_Time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        now = None
+        for data in records:
+            if 'Test_Time' not in data:
+                if now is None:
+                    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                data['Test_Time'] = now
             
-        with open(self.result_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=self.fieldnames)
-            writer.writerow(data)
-        print(f"Result saved for Site {data.get('Site_ID')}")
+        if self._fh is None:
+            self._open()
+        self._fh.write(b"".join([_format_row(data) for data in records]))
+        # Flush per save so the wafer map (and a crash) always sees every saved site
+        self._fh.flush()
+        for data in records:
+            print(f"Result saved for Site {data.get('Site_ID')}")
+
+    def close(self):
+        if self._fh:
+            self._fh.close()
+        self._fh = None
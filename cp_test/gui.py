@@ -1,7 +1,9 @@
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
                                QLineEdit, QPushButton, QCheckBox, QGroupBox, 
                                QTextEdit, QMessageBox)
-from PySide6.QtCore import Qt, Slot
+from PySide6.QtCore import Qt, Slot, QCoreApplication
+from automation.config_manager import ConfigManager
+from .data_manager import DataManager
 from .mapping_manager import MappingManager
 from .test_logic import CPTestRunner
 from .visualization import WaferMapGenerator
@@ -12,7 +14,14 @@ class CPTestWidget(QWidget):
         self.main_window = main_window
         self.mapping_mgr = MappingManager()
         self.map_gen = WaferMapGenerator()
+        self.data_manager = DataManager()
+        # Shared by every site's runner so its parsed power limits are reused
+        self.config_manager = ConfigManager()
         self.runner = None
+
+        app = QCoreApplication.instance()
+        if app:
+            app.aboutToQuit.connect(self.data_manager.close)
         
         self.setup_ui()
         self.update_coordinates()
@@ -96,7 +105,9 @@ class CPTestWidget(QWidget):
         self.log(f"--- Starting Test for Site {site_id} ---")
         
         # Initialize Runner
-        self.runner = CPTestRunner(self.main_window, site_id, coords[0], coords[1])
+        self.runner = CPTestRunner(self.main_window, site_id, coords[0], coords[1],
+                                   data_manager=self.data_manager,
+                                   config_manager=self.config_manager)
         self.runner.log_message.connect(self.log)
         self.runner.finished.connect(self.on_test_finished)
         self.runner.start()
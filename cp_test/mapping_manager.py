@@ -1,10 +1,16 @@
-import csv
 import os
+import numpy as np
+import pandas as pd
 
 class MappingManager:
     def __init__(self, layout_file="wafer_layout.csv"):
         self.layout_file = layout_file
-        self.mapping = {} # Site_ID -> (Row, Col)
+        # Site coordinates as parallel arrays, indexed through Site_ID -> position
+        self._rows = np.empty(0, dtype=np.int32)
+        self._cols = np.empty(0, dtype=np.int32)
+        self._idx = {}
+        # Known Site_IDs in ascending order, for get_next_site_id
+        self._sorted_ids = np.empty(0, dtype=np.int64)
         self.current_site_id = 1
         self.load_mapping()
 
@@ -13,30 +19,34 @@ class MappingManager:
             print(f"Warning: {self.layout_file} not found.")
             return
 
-        with open(self.layout_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                try:
-                    site_id = int(row['Site_ID'])
-                    r = int(row['Row'])
-                    c = int(row['Col'])
-                    self.mapping[site_id] = (r, c)
-                except ValueError:
-                    continue
-        print(f"Loaded {len(self.mapping)} sites from {self.layout_file}")
+        # Parse all rows at once; cells that aren't integers drop their row
+        df = pd.read_csv(self.layout_file, usecols=['Site_ID', 'Row', 'Col'],
+                         dtype=str, encoding='utf-8')
+        cols = df.apply(pd.to_numeric, errors='coerce').dropna()
+        cols = cols[(cols % 1 == 0).all(axis=1)].astype('int64')
+        # A repeated Site_ID keeps its last row
+        cols = cols.drop_duplicates('Site_ID', keep='last')
+        self._rows = cols['Row'].to_numpy(dtype=np.int32)
+        self._cols = cols['Col'].to_numpy(dtype=np.int32)
+        self._idx = {site_id: i for i, site_id in enumerate(cols['Site_ID'].tolist())}
+        self._sorted_ids = np.sort(cols['Site_ID'].to_numpy(dtype=np.int64))
+        print(f"Loaded {len(self._idx)} sites from {self.layout_file}")
 
     def get_coordinates(self, site_id):
-        return self.mapping.get(site_id)
+        i = self._idx.get(site_id)
+        if i is None:
+            return None
+        return int(self._rows[i]), int(self._cols[i])
 
     def get_next_site_id(self):
-        # Find the next valid site ID in the map
-        next_id = self.current_site_id + 1
-        if next_id in self.mapping:
-            return next_id
+        # Smallest site ID in the map after the current one (layouts may have gaps)
+        i = np.searchsorted(self._sorted_ids, self.current_site_id, side='right')
+        if i < self._sorted_ids.size:
+            return int(self._sorted_ids[i])
         return None
 
     def set_current_site(self, site_id):
-        if site_id in self.mapping:
+        if site_id in self._idx:
             self.current_site_id = site_id
             return True
         return False
@@ -1,6 +1,10 @@
+import os
+import re
 import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from PySide6.QtCore import QObject, Signal, QTimer
-from automation.test_sequencer import AutoTestSequencer
+from automation.test_sequencer import AutoTestSequencer, STAGE_DAC_ALIAS, STAGE_DAC_CHANNEL
 from automation.config_manager import ConfigManager
 from .data_manager import DataManager
 
@@ -9,20 +13,75 @@ ABORT_ON_POWER_FAIL = False
 # Debug Constant: Ignore Linearity Fail?
 IGNORE_LINEARITY_FAIL = True
 NO_LINEARITY_LIMIT = 1.0 # 1%
+# Upper bound on power supplies measured concurrently in check_power_limits
+MAX_MEASURE_WORKERS = 8
+# Extra hardware settle between linearity stages (ms), 0 = start the next stage immediately
+STAGE_SETTLE_MS = 0
+
+# Per-stage numeric result columns (S<n>_<column>) and their metrics keys
+_STAGE_METRICS = (
+    ('Gain', 'Gain'),
+    ('Offset', 'Offset'),
+    ('No_Linearity', 'Nonlinearity'),
+    ('Max_INL', 'Max_INL'),
+    ('Max_DNL', 'Max_DNL'),
+)
+
+# Result report fields, e.g.
+# Gain (Vout/Vin)               : 0.999999
+# Offset                        : 0.000001 V
+# Nonlinearity                  : 0.0010 % FSR
+# Max INL                       : 0.000793 LSB
+# Bytes patterns: the labels are ASCII, so the file never needs decoding
+_RE_GAIN = re.compile(rb"Gain \(Vout/Vin\)[\s:]+([-\d\.]+)")
+_RE_OFFSET = re.compile(rb"Offset[\s:]+([-\d\.]+)")
+_RE_NONLINEARITY = re.compile(rb"Nonlinearity[\s:]+([-\d\.]+)")
+_RE_MAX_INL = re.compile(rb"Max INL\s*[:=]\s*([-\d.]+)")
+_RE_MAX_DNL = re.compile(rb"Max DNL\s*[:=]\s*([-\d.]+)")
+_REPORT_FIELDS = (
+    ('Gain', _RE_GAIN),
+    ('Offset', _RE_OFFSET),
+    ('Nonlinearity', _RE_NONLINEARITY),
+    ('Max_INL', _RE_MAX_INL),
+    ('Max_DNL', _RE_MAX_DNL),
+)
+# The analysis block sits at the top of the report, ahead of the raw data
+REPORT_HEAD_BYTES = 4096
+
+def _parse_report(content):
+    metrics = {}
+    for key, pattern in _REPORT_FIELDS:
+        m = pattern.search(content)
+        if m:
+            metrics[key] = float(m.group(1))
+    return metrics
 
 class CPTestRunner(QObject):
     finished = Signal(dict) # Emits result data
     log_message = Signal(str)
+    # Minimum time between a stage ending and the next one starting (ms); tune per hardware
+    SETTLE_MS = STAGE_SETTLE_MS
 
-    def __init__(self, window, site_id, row, col):
+    def __init__(self, window, site_id, row, col, data_manager=None, config_manager=None):
         super().__init__()
         self.window = window
         self.site_id = site_id
         self.row = row
         self.col = col
         
-        self.config_manager = ConfigManager()
-        self.data_manager = DataManager()
+        # Shared across sites when passed in, so the power limits are parsed once
+        # per file change instead of once per site
+        self.config_manager = config_manager or ConfigManager()
+        # Shared across sites when passed in, so the result CSV stays open between sites
+        self.data_manager = data_manager or DataManager()
+        
+        # Per-stage DAC/power configs, built in memory at start(); the files are
+        # only written once, for the last stage run, when the test finishes
+        self._stage_configs = {}
+        self._applied_stage = None
+        # Power limits grouped by instrument, see _group_limits
+        self._limits_src = None
+        self._limit_groups = ()
         
         # Reusing logic from AutoTestSequencer where possible, 
         # but we need finer control for the "Fuse" mechanism.
@@ -38,10 +97,20 @@ class CPTestRunner(QObject):
             'Fail_Reason': ''
         }
         self.is_running = False
+        # Stage x metric table (_STAGE_METRICS order); NaN = stage produced no metrics.
+        # Folded into test_data once, in finish_test
+        self._stage_values = np.full((self.max_stages, len(_STAGE_METRICS)), np.nan)
+
+        # Newest stage report seen so far; later scans only look at newer files
+        self._last_result_ctime = 0.0
+        self._last_result_file = None
+        # Report path -> parsed metrics, so re-reading a report doesn't re-parse it
+        self._report_cache = {}
 
     def start(self):
         self.is_running = True
         self.log_message.emit(f"Starting CP Test for Site {self.site_id} (R{self.row}, C{self.col})")
+        self._stage_configs = self.config_manager.build_stage_configs(range(1, self.max_stages + 1))
         
         # 1. Power On
         self.log_message.emit("Executing Power On Sequence...")
@@ -64,7 +133,7 @@ class CPTestRunner(QObject):
     def on_power_on_finished(self):
         try:
             self.window.pwr_worker.finished_signal.disconnect(self.on_power_on_finished)
-        except:
+        except (RuntimeError, TypeError):
             pass
             
         if not self.is_running: return
@@ -99,96 +168,137 @@ class CPTestRunner(QObject):
         max_current_measured = 0.0
         overall_status = "PASS"
 
-        for limit in limits:
-            inst_name = limit.get('instrument')
-            try:
-                channel = int(limit.get('channel'))
-                min_c = float(limit.get('min_current', -float('inf')))
-                max_c = float(limit.get('max_current', float('inf')))
-            except:
+        # One batched query per instrument instead of a round-trip per channel.
+        # A supply's channels are read in order on one thread; different supplies
+        # are queried concurrently. Logging stays on this thread.
+        groups = self._group_limits(limits)
+        if len(groups) > 1:
+            with ThreadPoolExecutor(max_workers=min(len(groups), MAX_MEASURE_WORKERS)) as pool:
+                results = list(pool.map(self._measure_group, groups))
+        else:
+            results = [self._measure_group(g) for g in groups]
+
+        for (inst_name, _, group), (values, fallback_error, error) in zip(groups, results):
+            if error is not None:
+                # Same as the per-channel loop's except branch: log and fail
+                self.log_message.emit(f"Error measuring {inst_name}: {error}")
+                overall_status = "FAIL"
                 continue
+            if fallback_error is not None:
+                self.log_message.emit(
+                    f"Batched current query on {inst_name} failed ({fallback_error}); measured per channel")
 
-            inst = self.window.inst_mgr.get_instrument(inst_name)
-            if inst and inst.connected:
-                try:
-                    meas = inst.measure_current(channel)
-                    if meas > max_current_measured:
-                        max_current_measured = meas
-                    
-                    if not (min_c <= meas <= max_c):
-                        overall_status = "FAIL"
-                        self.log_message.emit(f"FAIL: {inst_name} CH{channel} Current {meas:.4f}A out of range ({min_c}, {max_c})")
-                except Exception as e:
-                    self.log_message.emit(f"Error measuring {inst_name}: {e}")
+            for (_, channel, min_c, max_c), meas in zip(group, values):
+                if meas > max_current_measured:
+                    max_current_measured = meas
+                
+                if not (min_c <= meas <= max_c):
                     overall_status = "FAIL"
+                    self.log_message.emit(f"FAIL: {inst_name} CH{channel} Current {meas:.4f}A out of range ({min_c}, {max_c})")
         
         return overall_status, max_current_measured
 
+    def _measure_group(self, limit_group):
+        """
+        Measures one instrument's limit channels.
+        Returns (values, fallback_error, error), see PowerSupply.measure_currents;
+        values is empty if the instrument is not connected or raised error.
+        """
+        inst_name, channels, _ = limit_group
+        inst = self.window.inst_mgr.get_instrument(inst_name)
+        if not (inst and inst.connected):
+            return (), None, None
+        try:
+            values, fallback_error = inst.measure_currents(channels)
+            return values, fallback_error, None
+        except Exception as e:
+            return (), None, e
+
+    def _group_limits(self, limits):
+        """
+        Returns ((inst_name, channels, limit_rows), ...) grouped by instrument.
+        get_power_limits returns the same tuple until the file changes, so the
+        grouping is only rebuilt when that object changes.
+        """
+        if limits is not self._limits_src:
+            groups = {}
+            for lim in limits:
+                groups.setdefault(lim[0], []).append(lim)
+            self._limit_groups = tuple(
+                (inst_name, [lim[1] for lim in group], tuple(group))
+                for inst_name, group in groups.items())
+            self._limits_src = limits
+        return self._limit_groups
+
     def run_stage(self):
         if not self.is_running: return
         
         i = self.current_stage
         self.log_message.emit(f"Running Stage {i}/{self.max_stages}")
         
-        # Config & Hardware Refresh
+        # Config & Hardware Refresh, applied in a worker; the sweep starts once it is done
+        dac_cfg, pwr_cfg = self._stage_configs.get(i, (None, None))
         try:
-            self.config_manager.modify_dac_config(i)
-            self.config_manager.modify_power_config(i)
-            self.window.apply_dac_config()
-            self.window.apply_power_config()
+            self.window.apply_configs_async(dac_cfg, pwr_cfg, self.on_stage_configured)
         except Exception as e:
             self.log_message.emit(f"Config Error: {e}")
             self.abort_test("Config Error")
+
+    def on_stage_configured(self, worker):
+        # The test may have been stopped while the config was being applied
+        if not self.is_running: return
+        if worker.error is not None:
+            self.abort_test("Config Error")
             return
 
-        # Calc Params
+        i = self.current_stage
+        self._applied_stage = i
+
+        # Calc Params (the GUI strings are formatted once per stage by the sequencer)
         try:
-            start_v, step_v, points = self.sequencer.calculate_scan_params(i)
+            scan_strings = self.sequencer.scan_strings(i)
         except Exception as e:
             self.log_message.emit(f"Param Error: {e}")
             self.abort_test("Param Error")
             return
 
         # Setup GUI params for the test
-        self.window.txt_start.setText(f"{start_v:.4f}")
-        self.window.txt_step.setText(f"{step_v:.6f}")
-        self.window.txt_points.setText(str(points))
-        if not self.window.rb_dac.isChecked():
-            self.window.rb_dac.setChecked(True)
-        self.window.combo_dac_sel_lin.setCurrentText("DAC1") 
-        self.window.txt_dac_ch.setText("10")
+        self.window.apply_linearity_params(*scan_strings, STAGE_DAC_ALIAS, STAGE_DAC_CHANNEL)
 
         # Start Test
         self.window.start_linearity_test()
         
         if hasattr(self.window, 'lin_worker') and self.window.lin_worker:
-            self.window.lin_worker.finished_signal.connect(self.on_stage_finished)
+            # QThread.finished: the worker's run() has returned, so the next stage
+            # can safely replace it
+            self.window.lin_worker.finished.connect(self.on_stage_finished)
         else:
             self.abort_test("Worker Error")
 
     def on_stage_finished(self):
+        # Hardware has been settling since the stage ended; that time counts against SETTLE_MS
+        stage_end = time.monotonic()
         try:
-            self.window.lin_worker.finished_signal.disconnect(self.on_stage_finished)
-        except:
+            self.window.lin_worker.finished.disconnect(self.on_stage_finished)
+        except (RuntimeError, TypeError):
             pass
+        # finished is emitted just before the thread exits; join it (returns at once)
+        self.window.lin_worker.wait()
             
         if not self.is_running: return
 
         # Collect Results for this stage
-        metrics = self.read_latest_stage_result()
+        metrics = self.stage_metrics()
         
         prefix = f'S{self.current_stage}'
         self.test_data[f'{prefix}_Gain_Config'] = self.sequencer.gain_map.get(self.current_stage)
-        self.test_data[f'{prefix}_Input_Amp'] = float(self.window.txt_start.text().replace('-','')) # approx
+        # Same string that was put in txt_start, so no read back from the widget
+        self.test_data[f'{prefix}_Input_Amp'] = float(self.sequencer.scan_strings(self.current_stage)[0].replace('-','')) # approx
         
         stage_result = 'PASS'
         
         if metrics:
-            self.test_data[f'{prefix}_Gain'] = metrics.get('Gain', 0)
-            self.test_data[f'{prefix}_Offset'] = metrics.get('Offset', 0)
-            self.test_data[f'{prefix}_No_Linearity'] = metrics.get('Nonlinearity', 0)
-            self.test_data[f'{prefix}_Max_INL'] = metrics.get('Max_INL', 0)
-            self.test_data[f'{prefix}_Max_DNL'] = metrics.get('Max_DNL', 0)
+            self._stage_values[self.current_stage - 1] = [metrics.get(key, 0) for _, key in _STAGE_METRICS]
             
             # Check Nonlinearity Limit
             nl = metrics.get('Nonlinearity', 0)
@@ -215,71 +325,113 @@ class CPTestRunner(QObject):
 
         self.current_stage += 1
         if self.current_stage <= self.max_stages:
-            QTimer.singleShot(500, self.run_stage)
+            delay = int(self.SETTLE_MS - (time.monotonic() - stage_end) * 1000)
+            if delay > 0:
+                QTimer.singleShot(delay, self.run_stage)
+            else:
+                self.run_stage()
         else:
             if self.test_data['Final_Result'] == 'PENDING':
                 self.test_data['Final_Result'] = 'PASS'
             self.finish_test()
 
+    def stage_metrics(self):
+        """
+        Returns the finished stage's metrics straight from the linearity worker,
+        rounded to the precision of the result report so the CSV matches what
+        was previously parsed back from it.
+        Falls back to parsing the latest report if the worker doesn't expose them.
+        """
+        worker = getattr(self.window, 'lin_worker', None)
+        if worker is None or not hasattr(worker, 'last_metrics'):
+            return self.read_latest_stage_result()
+
+        m = worker.last_metrics
+        if not m:
+            self.log_message.emit("Error: Linearity test produced no metrics.")
+            return None
+        return {
+            'Gain': round(float(m['gain']), 6),
+            'Offset': round(float(m['offset']), 6),
+            'Nonlinearity': round(float(m['nonlinearity_pct']), 4),
+            'Max_INL': round(float(m['max_inl']), 6),
+            'Max_DNL': round(float(m['max_dnl']), 6),
+        }
+
     def read_latest_stage_result(self):
         # Helper to parse the last generated result file
-        import os
         folder = "results/dc_linearity_result"
         if not os.path.exists(folder): 
             self.log_message.emit(f"Error: Result folder {folder} not found.")
             return None
-        files = [os.path.join(folder, f) for f in os.listdir(folder) if f.endswith('.txt')]
-        if not files: 
+        # One scandir pass for .txt files newer than the last report we picked;
+        # with none newer, the last one is still the latest
+        latest = self._last_result_file
+        latest_ctime = self._last_result_ctime
+        with os.scandir(folder) as it:
+            for entry in it:
+                if not entry.name.endswith('.txt'):
+                    continue
+                ctime = entry.stat().st_ctime
+                if ctime > latest_ctime:
+                    latest, latest_ctime = entry.path, ctime
+        if latest is None: 
             self.log_message.emit("Error: No result files found.")
             return None
-        latest = max(files, key=os.path.getctime)
+        self._last_result_file = latest
+        self._last_result_ctime = latest_ctime
+
+        cached = self._report_cache.get(latest)
+        if cached is not None:
+            return dict(cached)
         
         metrics = {}
         try:
-            # Try reading with utf-8 first, then fallback to gbk or ignore errors
-            content = ""
-            try:
-                with open(latest, 'r', encoding='utf-8') as f:
-                    content = f.read()
-            except UnicodeDecodeError:
-                with open(latest, 'r', encoding='gbk', errors='ignore') as f:
-                    content = f.read()
-
-            import re
-            
-            # Regex for new fields
-            # Gain (Vout/Vin)               : 0.999999
-            # Offset                        : 0.000001 V
-            # Nonlinearity                  : 0.0010 % FSR
-            
-            gain = re.search(r"Gain \(Vout/Vin\)[\s:]+([-\d\.]+)", content)
-            offset = re.search(r"Offset[\s:]+([-\d\.]+)", content)
-            nl = re.search(r"Nonlinearity[\s:]+([-\d\.]+)", content)
-            
-            inl = re.search(r"Max INL[:=]\s*([-\d\.]+)", content)
-            dnl = re.search(r"Max DNL[:=]\s*([-\d\.]+)", content)
-            
-            if gain: metrics['Gain'] = float(gain.group(1))
-            if offset: metrics['Offset'] = float(offset.group(1))
-            if nl: metrics['Nonlinearity'] = float(nl.group(1))
-            if inl: metrics['Max_INL'] = float(inl.group(1))
-            if dnl: metrics['Max_DNL'] = float(dnl.group(1))
+            with open(latest, 'rb') as f:
+                content = f.read(REPORT_HEAD_BYTES)
+                metrics = _parse_report(content)
+                if not metrics:
+                    # Unexpected layout; scan the whole file
+                    metrics = _parse_report(content + f.read())
             
             if not metrics:
                 self.log_message.emit(f"Warning: No metrics parsed from {latest}")
+            else:
+                self._report_cache[latest] = dict(metrics)
 
         except Exception as e:
             self.log_message.emit(f"Error reading result file {latest}: {e}")
             pass
         return metrics
 
+    def persist_stage_config(self):
+        # Leave the config files describing the last stage that was applied
+        if self._applied_stage is None:
+            return
+        try:
+            self.config_manager.modify_dac_config(self._applied_stage)
+            self.config_manager.modify_power_config(self._applied_stage)
+        except Exception as e:
+            self.log_message.emit(f"Config Error: {e}")
+
     def abort_test(self, reason):
         self.is_running = False
         self.test_data['Final_Result'] = 'FAIL'
         self.test_data['Fail_Reason'] = reason
         self.finish_test()
 
+    def _fold_stage_values(self):
+        """
+        Copies the per-stage metric table into test_data as S<n>_<column> entries.
+        """
+        values = self._stage_values
+        # NaN marks a metric the stage didn't produce; only the rest are copied
+        for stage, col in zip(*np.nonzero(~np.isnan(values))):
+            self.test_data[f'S{stage + 1}_{_STAGE_METRICS[col][0]}'] = values[stage, col].item()
+
     def finish_test(self):
+        self._fold_stage_values()
+        self.persist_stage_config()
         self.log_message.emit("Test Finished. Executing Power Off...")
         self.window.start_power_off()
         
@@ -1,21 +1,39 @@
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import os
-import seaborn as sns
 from datetime import datetime
 
+# Final_Result values in Color_Code order (1, 2, 3); 0 = untested/unknown
+RESULT_NAMES = ('PASS', 'PARTIAL', 'FAIL')
+
+# Only these columns are needed for the map; the per-stage columns are never parsed
+MAP_COLUMNS = ['Test_Time', 'Row', 'Col', 'Final_Result']
+MAP_DTYPES = {'Test_Time': str, 'Row': np.int16, 'Col': np.int16, 'Final_Result': 'category'}
+
 class WaferMapGenerator:
+    # result_file -> ((mtime_ns, size), png path) of the last rendered map
+    _cache = {}
+
     def __init__(self, result_file="Wafer_Sort_Results.csv"):
         self.result_file = result_file
         self.output_folder = "results"
         os.makedirs(self.output_folder, exist_ok=True)
 
     def generate_static_map(self):
-        if not os.path.exists(self.result_file):
+        try:
+            st = os.stat(self.result_file)
+        except OSError:
             return None
 
+        # Unchanged results file and the map is still on disk: nothing to redraw
+        key = (st.st_mtime_ns, st.st_size)
+        cached = WaferMapGenerator._cache.get(self.result_file)
+        if cached and cached[0] == key and os.path.exists(cached[1]):
+            print(f"Wafer Map unchanged: {cached[1]}")
+            return cached[1]
+
         try:
-            df = pd.read_csv(self.result_file)
+            df = pd.read_csv(self.result_file, usecols=MAP_COLUMNS, dtype=MAP_DTYPES)
         except Exception as e:
             print(f"Error reading CSV: {e}")
             return None
@@ -25,35 +43,63 @@ class WaferMapGenerator:
 
         # Deduplicate: Keep last Test_Time for each (Row, Col)
         # Assuming Test_Time is sortable string
-        df = df.sort_values('Test_Time').drop_duplicates(subset=['Row', 'Col'], keep='last')
+        # Stable sort so equal timestamps keep file order (the later row wins)
+        df = df.sort_values('Test_Time', kind='stable').drop_duplicates(subset=['Row', 'Col'], keep='last')
 
-        # Pivot for heatmap
         # Value to plot: Final_Result mapped to numbers?
-        # Green(PASS)=1, Yellow(PARTIAL)=2, Red(FAIL)=3
-        result_map = {'PASS': 1, 'PARTIAL': 2, 'FAIL': 3}
-        df['Color_Code'] = df['Final_Result'].map(result_map).fillna(0)
+        # Green(PASS)=1, Yellow(PARTIAL)=2, Red(FAIL)=3, anything else 0
+        # Map each category once; the trailing 0 catches code -1 (missing result)
+        results = df['Final_Result'].cat
+        lookup = np.array([RESULT_NAMES.index(name) + 1 if name in RESULT_NAMES else 0
+                           for name in results.categories] + [0], dtype=np.int8)
+        codes = lookup[results.codes.to_numpy()]
         
-        pivot_table = df.pivot(index='Row', columns='Col', values='Color_Code')
+        # Dense (Row, Col) grid filled by one scatter-assign; 0 = no site/no result
+        rows = df['Row'].to_numpy(dtype=np.int64)
+        cols = df['Col'].to_numpy(dtype=np.int64)
+        # Row/Col are 1-based; 0 or negative would wrap to the far edge of the grid
+        valid = (rows >= 1) & (cols >= 1)
+        if not valid.all():
+            print(f"Wafer Map: skipping {int((~valid).sum())} result(s) with Row/Col < 1")
+            rows, cols, codes = rows[valid], cols[valid], codes[valid]
+            if rows.size == 0:
+                return None
+        grid = np.zeros((rows.max(), cols.max()), dtype=np.int8)
+        grid[rows - 1, cols - 1] = codes
         
-        plt.figure(figsize=(10, 8))
-        # Custom cmap: 0=Empty(White), 1=Green, 2=Yellow, 3=Red
+        # matplotlib is only needed here. A bare Figure renders through Agg on
+        # savefig without touching pyplot or the GUI's Qt backend.
+        from matplotlib.figure import Figure
         from matplotlib.colors import ListedColormap
+        
+        fig = Figure(figsize=(10, 8))
+        ax = fig.add_subplot()
+        # Custom cmap: 0=Empty(White), 1=Green, 2=Yellow, 3=Red
         cmap = ListedColormap(['white', 'green', 'yellow', 'red'])
         
-        # We need to ensure the data range covers 0-3 for the colormap to work correctly if some values are missing
-        # A trick is to set vmin=0, vmax=3
-        ax = sns.heatmap(pivot_table, cmap=cmap, vmin=0, vmax=3, annot=True, fmt='g', 
-                         cbar=False, linewidths=.5, linecolor='gray')
+        # vmin/vmax pin the colours to codes 0-3 even if some codes are missing
+        ax.imshow(grid, cmap=cmap, vmin=0, vmax=3, aspect='equal', interpolation='nearest')
+        # Annotate tested sites only
+        for r, c, v in zip(rows - 1, cols - 1, codes):
+            ax.text(c, r, str(v), ha='center', va='center')
+        
+        # 1-based Row/Col labels and gray cell borders
+        ax.set_xticks(range(grid.shape[1]), labels=range(1, grid.shape[1] + 1))
+        ax.set_yticks(range(grid.shape[0]), labels=range(1, grid.shape[0] + 1))
+        ax.set_xticks(np.arange(-0.5, grid.shape[1]), minor=True)
+        ax.set_yticks(np.arange(-0.5, grid.shape[0]), minor=True)
+        ax.grid(which='minor', color='gray', linewidth=.5)
+        ax.tick_params(which='minor', length=0)
         
-        plt.title('Wafer Sort Map')
-        plt.xlabel('Column')
-        plt.ylabel('Row')
+        ax.set_title('Wafer Sort Map')
+        ax.set_xlabel('Column')
+        ax.set_ylabel('Row')
         
         # Save
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"Wafer_Map_{timestamp}.png"
         filepath = os.path.join(self.output_folder, filename)
-        plt.savefig(filepath)
-        plt.close()
+        fig.savefig(filepath)
+        WaferMapGenerator._cache[self.result_file] = (key, filepath)
         print(f"Wafer Map saved to {filepath}")
         return filepath
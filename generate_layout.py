@@ -1,6 +1,7 @@
-import json
 import csv
+import json
 import os
+import numpy as np
 
 def generate_layout_csv(json_file="wafer_layout.json", csv_file="wafer_layout.csv"):
     if not os.path.exists(json_file):
@@ -21,34 +22,25 @@ def generate_layout_csv(json_file="wafer_layout.json", csv_file="wafer_layout.cs
         print("Error: 'layout_grid' is empty or missing in JSON.")
         return
 
-    rows = []
-    site_id = start_id
-    
-    # Iterate through the grid
-    # row_idx is 0-based index from JSON, mapped to 1-based Row in CSV
-    # col_idx is 0-based index from JSON, mapped to 1-based Col in CSV
+    # Valid-site mask; ragged rows are right-padded with "no site"
+    mask = np.zeros((len(grid), max(len(row_data) for row_data in grid)), dtype=bool)
     for r_idx, row_data in enumerate(grid):
-        current_row = r_idx + 1
-        for c_idx, val in enumerate(row_data):
-            current_col = c_idx + 1
-            
-            # If val is 1 (or true), it's a valid site
-            if val:
-                rows.append({
-                    "Site_ID": site_id,
-                    "Row": current_row,
-                    "Col": current_col
-                })
-                site_id += 1
+        # If val is 1 (or true), it's a valid site
+        mask[r_idx, :len(row_data)] = row_data
+
+    # row_idx/col_idx are 0-based from JSON, mapped to 1-based Row/Col in CSV.
+    # nonzero() walks the grid row by row, so Site_IDs keep the row-major order.
+    r_idx, c_idx = np.nonzero(mask)
+    n_sites = r_idx.size
 
-    # Write to CSV
-    headers = ["Site_ID", "Row", "Col"]
+    # Write to CSV, streaming tuple rows straight from the index arrays
     try:
         with open(csv_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=headers)
-            writer.writeheader()
-            writer.writerows(rows)
-        print(f"Successfully generated {csv_file} with {len(rows)} sites.")
+            writer = csv.writer(f)
+            writer.writerow(("Site_ID", "Row", "Col"))
+            writer.writerows(zip(range(start_id, start_id + n_sites),
+                                 (r_idx + 1).tolist(), (c_idx + 1).tolist()))
+        print(f"Successfully generated {csv_file} with {n_sites} sites.")
     except Exception as e:
         print(f"Error writing CSV: {e}")
 
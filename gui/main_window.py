@@ -1,26 +1,127 @@
+import os
 import sys
-import time
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
 from PySide6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, 
                                QHBoxLayout, QPushButton, QLabel, QTextEdit, 
                                QTabWidget, QLineEdit, QCheckBox, QGroupBox, 
                                QRadioButton, QMessageBox, QProgressBar, QGridLayout,
-                               QTreeWidget, QTreeWidgetItem, QHeaderView, QInputDialog, QComboBox)
-from PySide6.QtCore import Qt, QThread
-
-import matplotlib
-matplotlib.use('QtAgg')
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+                               QTreeWidget, QTreeWidgetItem, QHeaderView, QComboBox,
+                               QSpinBox, QDialog, QDialogButtonBox, QFormLayout)
+from PySide6.QtCore import Qt, QThread, QSignalBlocker, QTimer, Signal, QStringListModel
 
 from core.instruments import InstrumentManager
-from core import utils
-from .workers import PowerWorker, LinearityWorker
-from cp_test.gui import CPTestWidget
+from core import utils, test_logic
+from .workers import PowerWorker, LinearityWorker, ConfigWorker
+
+# Default cap on linearity plot redraws (Hz); results arriving faster are coalesced
+MAX_REDRAW_RATE = 30
+
+# Linearity plot axis margin, as a fraction of the data span (matplotlib's default)
+PLOT_MARGIN = 0.05
+
+# Linearity plot PNGs
+PLOT_FOLDER = "image"
+PLOT_PREFIX = f"{PLOT_FOLDER}/dc_linearity_result_"
+
+# Log panel: lines are appended in batches every LOG_BATCH_MS; at most LOG_MAX_BLOCKS are kept
+LOG_BATCH_MS = 50
+LOG_MAX_BLOCKS = 2000
+
+# Upper bound on instruments connected/closed at the same time
+MAX_CONNECT_WORKERS = 8
+
+# Delay before a scheduled device tree refresh runs (ms); changes in between share it
+TREE_REFRESH_MS = 30
+
+# Quiet time after the last Simulation Mode toggle before it is applied (ms)
+SIM_TOGGLE_DEBOUNCE_MS = 150
+
+# Device Manager tree groups: (type key, label), in display order
+DEVICE_GROUPS = (
+    ("DP", "Power Supplies"),
+    ("DAC", "DACs"),
+    ("DM", "Multimeters"),
+    ("DG", "Signal Generators"),
+)
+
+# Attribute holding the address/port shown in the tree, per group
+_ADDRESS_ATTR = {"DP": "address", "DAC": "port", "DM": "address", "DG": "address"}
+
+def _device_type_key(inst):
+    """
+    Tree group of an instrument, from its class's TYPE_KEY.
+    """
+    return getattr(inst, 'TYPE_KEY', "Other")
+
+def _run_concurrently(calls):
+    """
+    Runs the zero-argument callables on a small thread pool (inline for one)
+    and returns their results in order. Used for instrument connect/close,
+    which wait on the bus rather than the CPU.
+    """
+    if len(calls) <= 1:
+        return [call() for call in calls]
+    with ThreadPoolExecutor(max_workers=min(len(calls), MAX_CONNECT_WORKERS)) as pool:
+        futures = [pool.submit(call) for call in calls]
+        return [f.result() for f in futures]
+
+def _padded_limits(*arrays):
+    """
+    Returns (low, high) covering the arrays with autoscale's 5% margin.
+    """
+    lo = min(float(np.nanmin(a)) for a in arrays)
+    hi = max(float(np.nanmax(a)) for a in arrays)
+    pad = (hi - lo) * PLOT_MARGIN or abs(lo) * PLOT_MARGIN or PLOT_MARGIN
+    return lo - pad, hi + pad
+
+class _AddDeviceDialog(QDialog):
+    """
+    Collects type, alias and address of a new device in one dialog.
+    OK is only enabled once alias and address are filled in.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Add Device")
+        form = QFormLayout(self)
+
+        self.combo_type = QComboBox()
+        self.combo_type.addItems([key for key, _ in DEVICE_GROUPS])
+        form.addRow("Type:", self.combo_type)
+        self.txt_alias = QLineEdit()
+        self.txt_alias.setPlaceholderText("e.g. DP2")
+        form.addRow("Alias:", self.txt_alias)
+        self.txt_address = QLineEdit()
+        self.txt_address.setPlaceholderText("VISA or COM")
+        form.addRow("Address:", self.txt_address)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        form.addRow(buttons)
+        self._btn_ok = buttons.button(QDialogButtonBox.Ok)
+        self.txt_alias.textChanged.connect(self._update_ok)
+        self.txt_address.textChanged.connect(self._update_ok)
+        self._update_ok()
+
+    def _update_ok(self):
+        self._btn_ok.setEnabled(bool(self.alias() and self.address()))
+
+    def device_type(self):
+        return self.combo_type.currentText()
+
+    def alias(self):
+        return self.txt_alias.text().strip()
+
+    def address(self):
+        return self.txt_address.text().strip()
 
 class MainWindow(QMainWindow):
+    # (png path, error message or ""), emitted from the plot save thread
+    plot_saved = Signal(str, str)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Automated Test System (PySide6)")
@@ -40,6 +141,28 @@ class MainWindow(QMainWindow):
             self.inst_mgr.register_instrument("DM1", "DM", "USB0::0xDEAD::0xBEEF::DM123::INSTR")
             self.inst_mgr.register_instrument("DG1", "DG", "USB0::0xDG::0xDG::DG123::INSTR")
 
+        # Registered aliases per device type, shared by the alias combo boxes;
+        # kept in step with the registry by refresh_device_tree
+        self._alias_models = {key: QStringListModel(self) for key, _ in DEVICE_GROUPS}
+        # type key -> combo boxes using that model, see _alias_combo
+        self._alias_combos = {}
+        self._sync_alias_models()
+
+        self.config_logic = test_logic.ConfigApplyLogic(self.inst_mgr)
+        self.config_worker = None
+        # Power/linearity workers, created on first use and restarted for each run
+        self.pwr_worker = None
+        self.lin_worker = None
+        # Replaced workers whose thread hasn't finished yet, see _idle_worker
+        self._busy_workers = set()
+
+        # Simulation Mode checkbox debounce, see toggle_sim_mode
+        self._pending_sim = None
+        self._sim_toggle_timer = QTimer(self)
+        self._sim_toggle_timer.setSingleShot(True)
+        self._sim_toggle_timer.setInterval(SIM_TOGGLE_DEBOUNCE_MS)
+        self._sim_toggle_timer.timeout.connect(self._apply_sim_mode)
+
         self.setup_ui()
         
     def setup_ui(self):
@@ -81,8 +204,17 @@ class MainWindow(QMainWindow):
         self.log_text = QTextEdit()
         self.log_text.setReadOnly(True)
         self.log_text.setMaximumHeight(150)
+        # Oldest lines are dropped past this many, so the document stays small
+        self.log_text.document().setMaximumBlockCount(LOG_MAX_BLOCKS)
         main_layout.addWidget(self.log_text)
 
+        # log() batches lines and appends them once per LOG_BATCH_MS
+        self._log_buf = []
+        self._log_timer = QTimer(self)
+        self._log_timer.setSingleShot(True)
+        self._log_timer.setInterval(LOG_BATCH_MS)
+        self._log_timer.timeout.connect(self._flush_log)
+
     def setup_connection_tab(self):
         tab = QWidget()
         layout = QVBoxLayout(tab)
@@ -114,63 +246,164 @@ class MainWindow(QMainWindow):
         self.tree.header().setSectionResizeMode(QHeaderView.ResizeToContents)
         layout.addWidget(self.tree)
         
+        # Changes are batched through _schedule_tree_refresh
+        self._tree_dirty = False
+        self._tree_timer = QTimer(self)
+        self._tree_timer.setSingleShot(True)
+        self._tree_timer.setInterval(TREE_REFRESH_MS)
+        self._tree_timer.timeout.connect(self._refresh_if_dirty)
+
+        self._build_device_groups()
         self.refresh_device_tree()
         
         self.tabs.addTab(tab, "Device Manager")
 
+    def _build_device_groups(self):
+        """
+        Creates the per-type top level items once; refresh_device_tree only
+        adds, updates or removes the device rows below them.
+        """
+        self._group_items = {key: QTreeWidgetItem([label]) for key, label in DEVICE_GROUPS}
+        self.tree.addTopLevelItems(list(self._group_items.values()))
+        # alias -> (type_key, row item)
+        self._tree_items = {}
+        # alias -> (status, address) last written to the row
+        self._row_cache = {}
+        # (alias, instrument, connected) per device at the last refresh
+        self._tree_fingerprint = None
+
+    def _schedule_tree_refresh(self):
+        """
+        Marks the device tree stale; one refresh runs TREE_REFRESH_MS later,
+        however many changes were made in the meantime.
+        """
+        self._tree_dirty = True
+        if not self._tree_timer.isActive():
+            self._tree_timer.start()
+
+    def _refresh_if_dirty(self):
+        if self._tree_dirty:
+            self.refresh_device_tree()
+
     def refresh_device_tree(self):
-        self.tree.clear()
+        self._tree_dirty = False
+        # Nothing to do if no device was added, removed, replaced or (dis)connected.
+        # The instruments themselves are kept so a replaced one never compares equal.
+        fingerprint = tuple((alias, inst, inst.connected)
+                            for alias, inst in self.inst_mgr.get_all_instruments().items())
+        if fingerprint == self._tree_fingerprint:
+            return
+        self._tree_fingerprint = fingerprint
+        # All row changes are painted in one pass and emit no item signals.
+        # The header sizes its columns to contents once, after the rows are in.
+        tree = self.tree
+        header = tree.header()
+        tree.setUpdatesEnabled(False)
+        header.setSectionResizeMode(QHeaderView.Interactive)
+        blocker = QSignalBlocker(tree)
+        try:
+            self._sync_device_rows()
+        finally:
+            blocker.unblock()
+            header.setSectionResizeMode(QHeaderView.ResizeToContents)
+            tree.expandAll()
+            tree.setUpdatesEnabled(True)
+        self._sync_alias_models()
+
+    def _sync_alias_models(self):
+        """
+        Updates the per-type alias lists from the registry. A model is only
+        reset when its list changed, and the combos keep their current text.
+        """
+        aliases = {key: [] for key in self._alias_models}
+        for alias, inst in self.inst_mgr.get_all_instruments().items():
+            type_key = _device_type_key(inst)
+            if type_key in aliases:
+                aliases[type_key].append(alias)
+        combos = self._alias_combos
+        for type_key, names in aliases.items():
+            model = self._alias_models[type_key]
+            if model.stringList() == names:
+                continue
+            users = [(c, c.currentText()) for c in combos.get(type_key, ())]
+            blockers = [QSignalBlocker(c) for c, _ in users]
+            try:
+                model.setStringList(names)
+                for combo, text in users:
+                    combo.setCurrentText(text)
+            finally:
+                for blocker in blockers:
+                    blocker.unblock()
+
+    def _alias_combo(self, type_key):
+        """
+        Editable alias combo box listing the registered devices of one type.
+        Typed aliases are used as-is and not added to the shared list.
+        """
+        combo = QComboBox()
+        combo.setEditable(True)
+        combo.setInsertPolicy(QComboBox.NoInsert)
+        combo.setModel(self._alias_models[type_key])
+        self._alias_combos.setdefault(type_key, []).append(combo)
+        return combo
+
+    def _sync_device_rows(self):
+        groups = self._group_items
+        tree_items = self._tree_items
+        row_cache = self._row_cache
         instruments = self.inst_mgr.get_all_instruments()
-        
-        # Group by type
-        groups = {
-            "DP": QTreeWidgetItem(["Power Supplies"]),
-            "DAC": QTreeWidgetItem(["DACs"]),
-            "DM": QTreeWidgetItem(["Multimeters"]),
-            "DG": QTreeWidgetItem(["Signal Generators"])
-        }
-        
-        for key, item in groups.items():
-            self.tree.addTopLevelItem(item)
-            item.setExpanded(True)
+
+        # Rows for removed devices (or whose type changed) are taken out; the rest stay
+        for alias in list(tree_items):
+            inst = instruments.get(alias)
+            type_key, item = tree_items[alias]
+            if inst is None or _device_type_key(inst) != type_key:
+                groups[type_key].removeChild(item)
+                del tree_items[alias]
+                row_cache.pop(alias, None)
             
+        # New rows are collected per group and inserted with one addChildren each
+        new_rows = {}
         for alias, inst in instruments.items():
-            # Determine type based on class name for simplicity or we should store type
-            # In register_instrument we didn't store type explicitly in the object, 
-            # but we can infer or store it. 
-            # Let's infer from class name
-            cls_name = inst.__class__.__name__
-            type_key = "DP" if "PowerSupply" in cls_name else \
-                       "DAC" if "DAC" in cls_name else \
-                       "DM" if "Multimeter" in cls_name else \
-                       "DG" if "SignalGenerator" in cls_name else "Other"
-            
-            if type_key in groups:
-                status = "Connected" if inst.connected else "Disconnected"
-                color = Qt.green if inst.connected else Qt.red
-                
-                # Handle different attribute names for address/port
-                addr = getattr(inst, 'address', getattr(inst, 'port', 'Unknown'))
-                
+            type_key = _device_type_key(inst)
+            if type_key not in groups:
+                continue
+
+            status = "Connected" if inst.connected else "Disconnected"
+            addr = getattr(inst, _ADDRESS_ATTR[type_key], 'Unknown')
+
+            entry = tree_items.get(alias)
+            if entry is None:
                 item = QTreeWidgetItem([alias, type_key, addr, status])
-                item.setForeground(3, color)
-                groups[type_key].addChild(item)
+                item.setForeground(3, Qt.green if inst.connected else Qt.red)
+                new_rows.setdefault(type_key, []).append(item)
+                tree_items[alias] = (type_key, item)
+                row_cache[alias] = (status, addr)
+                continue
+
+            # Existing row: nothing to do unless status or address changed
+            cached = row_cache.get(alias)
+            if cached == (status, addr):
+                continue
+            item = entry[1]
+            if cached is None or cached[1] != addr:
+                item.setText(2, addr)
+            if cached is None or cached[0] != status:
+                item.setText(3, status)
+                item.setForeground(3, Qt.green if inst.connected else Qt.red)
+            row_cache[alias] = (status, addr)
+
+        for type_key, items in new_rows.items():
+            groups[type_key].addChildren(items)
 
     def add_device_dialog(self):
-        # Simple dialog to add device
-        # For a real app, create a custom QDialog. Here using QInputDialog sequences for brevity.
-        types = ["DP", "DAC", "DM", "DG"]
-        type_sel, ok = QInputDialog.getItem(self, "Add Device", "Select Type:", types, 0, False)
-        if not ok: return
-        
-        alias, ok = QInputDialog.getText(self, "Add Device", "Enter Alias (e.g. DP2):")
-        if not ok or not alias: return
-        
-        address, ok = QInputDialog.getText(self, "Add Device", "Enter Address (VISA or COM):")
-        if not ok or not address: return
+        dlg = _AddDeviceDialog(self)
+        if not dlg.exec(): # Rejected
+            return
+        type_sel, alias, address = dlg.device_type(), dlg.alias(), dlg.address()
         
         self.inst_mgr.register_instrument(alias, type_sel, address)
-        self.refresh_device_tree()
+        self._schedule_tree_refresh()
         self.log(f"Added device: {alias} ({type_sel}) at {address}")
 
     def remove_selected_device(self):
@@ -180,35 +413,62 @@ class MainWindow(QMainWindow):
             
         alias = item.text(0)
         self.inst_mgr.remove_instrument(alias)
-        self.refresh_device_tree()
+        self._row_cache.pop(alias, None)
+        self._schedule_tree_refresh()
         self.log(f"Removed device: {alias}")
 
     def connect_all_devices(self):
+        """
+        Connects every disconnected instrument. The opens run concurrently, but
+        the call still returns only once all of them are done (the automated
+        sequences check the connections right after).
+        """
+        # A sim mode toggle still waiting on its debounce applies first
+        self._apply_sim_mode()
         self.log("Connecting all devices...")
         instruments = self.inst_mgr.get_all_instruments()
-        for alias, inst in instruments.items():
-            if not inst.connected:
-                if inst.connect():
-                    self.log(f"Connected to {alias}")
-                else:
-                    self.log(f"Failed to connect to {alias}")
-        self.refresh_device_tree()
+        pending = [(alias, inst) for alias, inst in instruments.items() if not inst.connected]
+        for (alias, _), ok in zip(pending, _run_concurrently([inst.connect for _, inst in pending])):
+            if ok:
+                self.log(f"Connected to {alias}")
+            else:
+                self.log(f"Failed to connect to {alias}")
+        self._schedule_tree_refresh()
 
     def disconnect_all_devices(self):
         self.log("Disconnecting all devices...")
         instruments = self.inst_mgr.get_all_instruments()
-        for alias, inst in instruments.items():
-            if inst.connected:
-                inst.close()
-                self.log(f"Disconnected {alias}")
-        self.refresh_device_tree()
+        pending = [(alias, inst) for alias, inst in instruments.items() if inst.connected]
+        _run_concurrently([inst.close for _, inst in pending])
+        for alias, _ in pending:
+            self.log(f"Disconnected {alias}")
+        self._schedule_tree_refresh()
 
     def log(self, msg):
+        # Workers deliver newline-joined batches (TestContext); stamp every line
         ts = datetime.now().strftime("%H:%M:%S")
-        self.log_text.append(f"[{ts}] {msg}")
+        self._log_buf.extend(f"[{ts}] {line}" for line in str(msg).split("\n"))
+        if not self._log_timer.isActive():
+            self._log_timer.start()
+
+    def _flush_log(self):
+        if self._log_buf:
+            self.log_text.append("\n".join(self._log_buf))
+            self._log_buf.clear()
 
     def toggle_sim_mode(self, state):
-        is_sim = (state == 2) # 2 is Checked
+        # Debounced: rapid toggles collapse into one _apply_sim_mode with the final state
+        self._pending_sim = (state == 2) # 2 is Checked
+        self._sim_toggle_timer.start()
+
+    def _apply_sim_mode(self):
+        self._sim_toggle_timer.stop()
+        is_sim = self._pending_sim
+        if is_sim is None:
+            return
+        self._pending_sim = None
+        if is_sim == self.inst_mgr.simulation_mode:
+            return # toggled back before the debounce ran out
         self.inst_mgr.simulation_mode = is_sim
         self.log(f"Simulation Mode set to: {is_sim}")
         # Re-connect logic might be needed if mode changes, but for now just log
@@ -243,15 +503,13 @@ class MainWindow(QMainWindow):
         
         l_dac_row1 = QHBoxLayout()
         l_dac_row1.addWidget(QLabel("DAC Alias:"))
-        self.combo_dac_sel = QComboBox() # Populate with DACs
-        self.combo_dac_sel.setEditable(True)
-        self.combo_dac_sel.addItem("DAC1")
+        self.combo_dac_sel = self._alias_combo("DAC")
         l_dac_row1.addWidget(self.combo_dac_sel)
         l_dac.addLayout(l_dac_row1)
         
-        btn_load_dac = QPushButton("Load & Apply DAC_Config.csv")
-        btn_load_dac.clicked.connect(self.apply_dac_config)
-        l_dac.addWidget(btn_load_dac)
+        self.btn_load_dac = QPushButton("Load & Apply DAC_Config.csv")
+        self.btn_load_dac.clicked.connect(lambda: self.start_config_worker("DAC"))
+        l_dac.addWidget(self.btn_load_dac)
         
         layout.addWidget(grp_dac)
         
@@ -259,9 +517,9 @@ class MainWindow(QMainWindow):
         grp_pwr = QGroupBox("Power Configuration")
         l_pwr = QVBoxLayout(grp_pwr)
         
-        btn_load_pwr = QPushButton("Load & Apply Power_Config.yaml")
-        btn_load_pwr.clicked.connect(self.apply_power_config)
-        l_pwr.addWidget(btn_load_pwr)
+        self.btn_load_pwr = QPushButton("Load & Apply Power_Config.yaml")
+        self.btn_load_pwr.clicked.connect(lambda: self.start_config_worker("PWR"))
+        l_pwr.addWidget(self.btn_load_pwr)
         
         layout.addWidget(grp_pwr)
         layout.addStretch()
@@ -306,9 +564,7 @@ class MainWindow(QMainWindow):
         l_dac_settings.setContentsMargins(0, 0, 0, 0)
         
         l_dac_settings.addWidget(QLabel("DAC Alias:"))
-        self.combo_dac_sel_lin = QComboBox()
-        self.combo_dac_sel_lin.addItem("DAC1")
-        self.combo_dac_sel_lin.setEditable(True)
+        self.combo_dac_sel_lin = self._alias_combo("DAC")
         l_dac_settings.addWidget(self.combo_dac_sel_lin)
 
         l_dac_settings.addWidget(QLabel("DAC Channel:"))
@@ -322,9 +578,7 @@ class MainWindow(QMainWindow):
         l_dg_settings.setContentsMargins(0, 0, 0, 0)
 
         l_dg_settings.addWidget(QLabel("Signal Generator Alias:"))
-        self.combo_dg_sel = QComboBox()
-        self.combo_dg_sel.addItem("DG1")
-        self.combo_dg_sel.setEditable(True)
+        self.combo_dg_sel = self._alias_combo("DG")
         l_dg_settings.addWidget(self.combo_dg_sel)
 
         l_dg_settings.addWidget(QLabel("DG Channel:"))
@@ -342,9 +596,7 @@ class MainWindow(QMainWindow):
 
         # --- Common Settings ---
         l_param.addWidget(QLabel("Multimeter Alias:"))
-        self.combo_dm_sel = QComboBox()
-        self.combo_dm_sel.addItem("DM1")
-        self.combo_dm_sel.setEditable(True)
+        self.combo_dm_sel = self._alias_combo("DM")
         l_param.addWidget(self.combo_dm_sel)
 
         l_left.addWidget(grp_param)
@@ -355,151 +607,222 @@ class MainWindow(QMainWindow):
         
         self.progress_bar = QProgressBar()
         l_left.addWidget(self.progress_bar)
+
+        l_left.addWidget(QLabel("Max Redraw Rate (Hz):"))
+        self.spin_max_rate = QSpinBox()
+        self.spin_max_rate.setRange(1, 120)
+        self.spin_max_rate.setValue(MAX_REDRAW_RATE)
+        self.spin_max_rate.valueChanged.connect(self.set_max_redraw_rate)
+        l_left.addWidget(self.spin_max_rate)
         
         l_left.addStretch()
         layout.addWidget(left_panel)
         
-        # Right Panel: Plot
-        self.figure = Figure()
-        self.canvas = FigureCanvas(self.figure)
-        layout.addWidget(self.canvas)
+        # Right Panel: Plot. matplotlib is only imported, and the canvas built, when
+        # the tab is first shown or the first result arrives (_ensure_plot_canvas)
+        self._lin_tab = tab
+        self._plot_layout = layout
+        self.figure = None
+        self.canvas = None
+
+        # Axes and lines are created on the first result, see _init_plot
+        self._plot_ax = None
+        self._line_meas = None
+        self._line_fit = None
+        self._plot_limits = None
+        # (gain, offset) shown in the fit label
+        self._last_fit = None
+
+        # Plot PNGs are encoded and written on one background thread, in order
+        self._save_pool = ThreadPoolExecutor(max_workers=1)
+        self._plot_saves = []
+        self.plot_saved.connect(self.on_plot_saved)
+
+        # Redraw throttle: the timer runs for one redraw interval after each draw
+        self._pending_plot = None
+        self._redraw_timer = QTimer(self)
+        self._redraw_timer.setSingleShot(True)
+        self._redraw_timer.timeout.connect(self._do_redraw)
+        self.set_max_redraw_rate(MAX_REDRAW_RATE)
         
         self.tabs.addTab(tab, "Linearity Test")
+        self.tabs.currentChanged.connect(self._on_tab_changed)
+
+    def _on_tab_changed(self, index):
+        widget = self.tabs.widget(index)
+        if widget is self._lin_tab:
+            self._ensure_plot_canvas()
+        elif widget is self._cp_tab:
+            self._ensure_cp_test_widget()
+
+    def _ensure_plot_canvas(self):
+        if self.figure is not None:
+            return
+        import matplotlib
+        matplotlib.use('QtAgg')
+        from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+
+        self.figure = Figure()
+        self.canvas = FigureCanvas(self.figure)
+        self._plot_layout.addWidget(self.canvas)
 
     def setup_cp_test_tab(self):
+        # cp_test (and pandas with it) is only imported, and the widget built,
+        # when the tab is first shown (_ensure_cp_test_widget)
+        self._cp_tab = QWidget()
+        self._cp_layout = QVBoxLayout(self._cp_tab)
+        self._cp_layout.setContentsMargins(0, 0, 0, 0)
+        self.cp_test_widget = None
+        self.tabs.addTab(self._cp_tab, "CP Wafer Sort")
+
+    def _ensure_cp_test_widget(self):
+        if self.cp_test_widget is not None:
+            return
+        from cp_test.gui import CPTestWidget
+
         self.cp_test_widget = CPTestWidget(self)
-        self.tabs.addTab(self.cp_test_widget, "CP Wafer Sort")
+        self._cp_layout.addWidget(self.cp_test_widget)
 
     def update_source_visibility(self):
         is_dac = self.rb_dac.isChecked()
         self.widget_dac_settings.setVisible(is_dac)
         self.widget_dg_settings.setVisible(not is_dac)
 
+    def apply_linearity_params(self, start_s, step_s, points_s, dac_alias, dac_ch):
+        """
+        Fills the Linearity tab for a DAC sweep in one go (used by the automated sequences).
+        Text/combo writes run with signals blocked and are skipped when unchanged.
+        """
+        combo, rb_dac = self.combo_dac_sel_lin, self.rb_dac
+        edits = ((self.txt_start, start_s), (self.txt_step, step_s),
+                 (self.txt_points, points_s), (self.txt_dac_ch, dac_ch))
+        blockers = [QSignalBlocker(w) for w, _ in edits]
+        blockers.append(QSignalBlocker(combo))
+        try:
+            for edit, text in edits:
+                if edit.text() != text:
+                    edit.setText(text)
+            if combo.currentText() != dac_alias:
+                combo.setCurrentText(dac_alias)
+        finally:
+            for blocker in blockers:
+                blocker.unblock()
+
+        # Not blocked: toggled drives update_source_visibility
+        if not rb_dac.isChecked():
+            rb_dac.setChecked(True)
+
     # --- Slots ---
 
+    def closeEvent(self, event):
+        # Worker threads are joined before the window (and the QThread objects) go away.
+        # A linearity sweep is stopped; a power sequence is left to complete so
+        # no rail is left half sequenced.
+        if self.lin_worker is not None:
+            self.lin_worker.stop()
+        for worker in (self.lin_worker, self.pwr_worker, self.config_worker, *self._busy_workers):
+            if worker is not None:
+                worker.wait()
+        self._save_pool.shutdown(wait=True)
+        super().closeEvent(event)
+
+    def _idle_worker(self, worker):
+        """
+        Returns worker if it exists and can be started again, else None.
+        A worker that is still running is kept referenced until its thread
+        finishes, so replacing it never destroys a running QThread.
+        """
+        if worker is None:
+            return None
+        if not worker.isRunning():
+            return worker
+        self._busy_workers.add(worker)
+        worker.finished.connect(lambda w=worker: self._busy_workers.discard(w))
+        return None
+
     def start_power_on(self):
         self.log("Starting Power ON Sequence...")
-        # No longer need to pass address, logic uses registry
-        self.pwr_worker = PowerWorker(self.inst_mgr, "ON")
-        self.pwr_worker.log_signal.connect(self.log)
-        self.pwr_worker.finished_signal.connect(lambda: self.log("Power ON Sequence Completed."))
-        self.pwr_worker.start()
+        self._start_power_sequence("ON")
 
     def start_power_off(self):
         self.log("Starting Power OFF Sequence...")
-        self.pwr_worker = PowerWorker(self.inst_mgr, "OFF")
-        self.pwr_worker.log_signal.connect(self.log)
-        self.pwr_worker.finished_signal.connect(lambda: self.log("Power OFF Sequence Completed."))
-        self.pwr_worker.start()
-
-    def apply_dac_config(self):
-        self.log("Applying DAC Configuration...")
-        configs = utils.load_csv_config("DAC_Config.csv")
-        if not configs:
-            self.log("Error: DAC_Config.csv not found or empty.")
-            return
-            
-        dac_alias = self.combo_dac_sel.currentText()
-        dac = self.inst_mgr.get_instrument(dac_alias)
-        
-        if not dac:
-            self.log(f"Error: DAC '{dac_alias}' not found in registry. Please add it in Device Manager.")
-            return
-        
-        if not dac.connected:
-            if not dac.connect():
-                self.log(f"Error: Could not connect to DAC '{dac_alias}'")
-                return
-            
-        # Pre-process configs into a dictionary
-        dac_data = {} 
-        for item in configs:
-            try:
-                ch_name = item['Channel']
-                ch_idx = int(ch_name.replace("DAC", ""))
-                dac_data[ch_idx] = {
-                    'range': float(item['Range']),
-                    'voltage': float(item['Voltage'])
-                }
-            except Exception:
-                continue
-
-        # Process in chunks of 4 channels (Total 32 channels: 0-31)
-        for i in range(0, 32, 4):
-            chunk_indices = [i, i+1, i+2, i+3]
-            
-            # Prepare data for this chunk
-            chunk_ranges = []
-            
-            # Check if any channel in this chunk is present in the config file
-            # If so, we process the whole chunk (filling missing ones with defaults)
-            # If the whole chunk is missing from config, we skip it
-            chunk_has_data = any(idx in dac_data for idx in chunk_indices)
-            if not chunk_has_data:
-                continue
+        self._start_power_sequence("OFF")
 
-            for idx in chunk_indices:
-                if idx in dac_data:
-                    chunk_ranges.append(dac_data[idx]['range'])
-                else:
-                    chunk_ranges.append(2.5) # Default range
-
-            # 1. Calculate and Send Range/Gear Command
-            # Logic from config_loader.py
-            dac_chip_num = 0 if i < 16 else 1
-            register_addr = 13 - (i % 16) // 4
-            
-            gear_code = utils.calculate_gear_code(chunk_ranges)
-            
-            cmd_range = f"DAC{dac_chip_num:02d} {register_addr} {gear_code};"
-            self.log(f"Set Range Group {i}-{i+3}: {cmd_range}")
-            dac.send_raw_command(cmd_range)
-            time.sleep(0.1)
-            
-            # 2. Send Output Commands for channels in this chunk
-            for j, idx in enumerate(chunk_indices):
-                if idx in dac_data:
-                    v_range = chunk_ranges[j]
-                    target_v = dac_data[idx]['voltage']
-                    
-                    code = utils.calculate_dac_code(str(v_range), target_v)
-                    self.log(f"Set DAC{idx} ({v_range}V) to {target_v}V -> Code {code}")
-                    dac.set_output(idx, code)
-                    time.sleep(0.05)
-        
-        self.log("DAC Configuration Completed.")
-
-    def apply_power_config(self):
-        self.log("Applying Power Configuration...")
-        configs = utils.load_yaml_config("Power_Config.yaml")
-        if not configs:
-            self.log("Error: Power_Config.yaml not found.")
+    def _start_power_sequence(self, mode):
+        # One PowerWorker is reused for every run; its signals are connected once
+        # No longer need to pass address, logic uses registry
+        worker = self._idle_worker(self.pwr_worker)
+        if worker is None:
+            worker = PowerWorker(self.inst_mgr, mode)
+            worker.log_signal.connect(self.log)
+            worker.finished_signal.connect(lambda w=worker: self.log(f"Power {w.mode} Sequence Completed."))
+        worker.mode = mode
+        self.pwr_worker = worker
+        worker.start()
+
+    def apply_dac_config(self, configs=None):
+        """
+        Applies DAC_Config.csv, or the given rows (same format) if passed.
+        Runs on the calling thread; AutoTestSequencer relies on it having
+        finished before the next step. The button uses start_config_worker and
+        the CP runner apply_configs_async.
+        """
+        context = test_logic.TestContext(log_callback=self.log)
+        self.config_logic.apply_dac_config(context, self.combo_dac_sel.currentText(), configs)
+        context.flush()
+        # The DAC may have been connected on the way
+        self._schedule_tree_refresh()
+
+    def apply_power_config(self, configs=None):
+        """
+        Applies Power_Config.yaml, or the given items (same format) if passed.
+        Runs on the calling thread, see apply_dac_config.
+        """
+        context = test_logic.TestContext(log_callback=self.log)
+        self.config_logic.apply_power_config(context, configs)
+        context.flush()
+        # Power supplies may have been connected on the way
+        self._schedule_tree_refresh()
+
+    def start_config_worker(self, kind):
+        """
+        Applies the DAC ("DAC") or power ("PWR") config file in a ConfigWorker,
+        with the Load & Apply buttons disabled until it finishes.
+        """
+        if self.config_worker is not None and self.config_worker.isRunning():
             return
-            
-        # Logic needs to find DP by name in config, so we just ensure they are connected
-        # Or we iterate configs and find the DP in registry
-        
-        for item in configs:
-            try:
-                dp_name = item['instrument']
-                ch = item['channel']
-                volt = float(item['voltage'])
-                curr = float(item['current'])
-                
-                dp = self.inst_mgr.get_instrument(dp_name)
-                if not dp:
-                    self.log(f"Error: Power Supply '{dp_name}' not found in registry.")
-                    continue
-                    
-                if not dp.connected:
-                    dp.connect()
-                
-                self.log(f"Set {dp_name} CH{ch}: {volt}V, {curr}A")
-                dp.set_channel(ch, volt, curr)
-            except Exception as e:
-                self.log(f"Error setting DP: {e}")
-        
-        self.log("Power Configuration Completed.")
+        self.btn_load_dac.setEnabled(False)
+        self.btn_load_pwr.setEnabled(False)
+        self.config_worker = ConfigWorker(self.inst_mgr, kind, self.combo_dac_sel.currentText())
+        self.config_worker.log_signal.connect(self.log)
+        self.config_worker.finished_signal.connect(self.on_config_worker_finished)
+        self.config_worker.start()
+
+    def apply_configs_async(self, dac_configs, power_configs, on_done):
+        """
+        Applies the DAC config then the power config (None = the config files)
+        in a ConfigWorker and calls on_done(worker) once both are done, so the
+        range-group delays no longer block the event loop. worker.error holds
+        the exception if applying failed.
+        """
+        if self.config_worker is not None and self.config_worker.isRunning():
+            # A Load & Apply click is still running; let it finish first
+            self.config_worker.wait()
+        self.btn_load_dac.setEnabled(False)
+        self.btn_load_pwr.setEnabled(False)
+        worker = ConfigWorker(self.inst_mgr, "ALL", self.combo_dac_sel.currentText(),
+                              dac_configs, power_configs)
+        worker.log_signal.connect(self.log)
+        worker.finished_signal.connect(self.on_config_worker_finished)
+        worker.finished_signal.connect(lambda: on_done(worker))
+        self.config_worker = worker
+        worker.start()
+
+    def on_config_worker_finished(self):
+        self.btn_load_dac.setEnabled(True)
+        self.btn_load_pwr.setEnabled(True)
+        self._schedule_tree_refresh()
 
     def start_linearity_test(self):
         try:
@@ -523,42 +846,127 @@ class MainWindow(QMainWindow):
         
         dm_alias = self.combo_dm_sel.currentText()
         
-        self.lin_worker = LinearityWorker(self.inst_mgr, source_type, start_v, step_v, points, dac_alias, active_ch, dm_alias, dg_alias)
-        self.lin_worker.log_signal.connect(self.log)
-        self.lin_worker.progress_signal.connect(self.progress_bar.setValue)
-        self.lin_worker.result_signal.connect(self.update_plot)
-        self.lin_worker.finished_signal.connect(lambda: self.log("Linearity Test Completed."))
-        self.lin_worker.start()
-
-    def update_plot(self, x, y, metrics):
-        self.figure.clear()
+        params = (source_type, start_v, step_v, points, dac_alias, active_ch, dm_alias, dg_alias)
+        # Reused across runs like pwr_worker, see _start_power_sequence
+        worker = self._idle_worker(self.lin_worker)
+        if worker is None:
+            worker = LinearityWorker(self.inst_mgr, *params)
+            worker.log_signal.connect(self.log)
+            worker.progress_signal.connect(self.progress_bar.setValue)
+            worker.result_signal.connect(self.update_plot)
+            worker.finished_signal.connect(lambda w=worker: self.on_linearity_finished(w))
+        else:
+            worker.configure(*params)
+        self.lin_worker = worker
+        # No second run from the button until this one has finished
+        self.btn_start_lin.setEnabled(False)
+        self.progress_bar.setValue(0)
+        worker.start()
+
+    def on_linearity_finished(self, worker):
+        self.log("Linearity Test Completed.")
+        # A replaced worker finishing late must not unlock the current run
+        if worker is self.lin_worker:
+            self.btn_start_lin.setEnabled(True)
+
+    def _init_plot(self):
+        """
+        Builds the linearity axes and line artists once; updates only set their data.
+        """
         ax = self.figure.add_subplot(111)
-        ax.plot(x, y, 'b.-', label='Measured')
-        
-        gain = metrics['gain']
-        offset = metrics['offset']
-        y_fit = np.array(x) * gain + offset
-        ax.plot(x, y_fit, 'r--', label=f'Fit (G={gain:.4f}, Off={offset:.4f})')
+        self._line_meas, = ax.plot([], [], 'b.-', label='Measured')
+        self._line_fit, = ax.plot([], [], 'r--', label='Fit')
         
         ax.set_title("DC Linearity")
         ax.set_xlabel("Input (V)")
         ax.set_ylabel("Measured (V)")
-        ax.legend()
         ax.grid(True)
+        self._plot_ax = ax
+
+    def set_max_redraw_rate(self, rate_hz):
+        self._redraw_timer.setInterval(max(1, round(1000 / rate_hz)))
+
+    def update_plot(self, x, y, metrics):
+        # Draw at once unless a redraw just happened; then only the newest
+        # result is kept and drawn when the interval ends. Drawing the first
+        # one immediately queues its PNG save before the worker's finished
+        # handlers run (they wait for it via wait_for_plot_saves).
+        self._pending_plot = (x, y, metrics)
+        if not self._redraw_timer.isActive():
+            self._do_redraw()
+
+    def _do_redraw(self):
+        pending = self._pending_plot
+        if pending is None:
+            return
+        self._pending_plot = None
+        self._redraw_timer.start()
+        x, y, metrics = pending
+
+        if self._plot_ax is None:
+            # Automated runs can plot without the tab ever being shown
+            self._ensure_plot_canvas()
+            self._init_plot()
+        ax = self._plot_ax
         
+        gain = metrics['gain']
+        offset = metrics['offset']
+        self._line_meas.set_data(x, y)
+        self._line_fit.set_data(x, metrics['y_fit'])
+        # Fit label and legend layout only change with the fit itself
+        fit_label_changed = (gain, offset) != self._last_fit
+        if fit_label_changed:
+            self._line_fit.set_label(f'Fit (G={gain:.4f}, Off={offset:.4f})')
+            self._last_fit = (gain, offset)
+        
+        # Axes, labels and grid are kept; only the data limits and legend text change.
+        # The sweep's bounds are known here, so the limits are set directly
+        # instead of going through relim()/autoscale_view().
+        limits = (_padded_limits(x), _padded_limits(y, metrics['y_fit']))
+        if limits != self._plot_limits:
+            ax.set_xlim(*limits[0])
+            ax.set_ylim(*limits[1])
+            self._plot_limits = limits
+        if fit_label_changed:
+            ax.legend()
+        
+        # One synchronous render serves both the screen and the saved PNG below
+        # (savefig used to render the whole figure a second time)
         self.canvas.draw()
         
         self.log(f"Metrics: Gain={gain:.6f}, Offset={offset:.6f}")
-        self.log(f"Max INL: {np.max(np.abs(metrics['inl'])):.4f} LSB")
-        self.log(f"Max DNL: {np.max(np.abs(metrics['dnl'])):.4f} LSB")
-
-        # Save Plot
-        import os
-        os.makedirs("image", exist_ok=True)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        img_filename = f"image/dc_linearity_result_{timestamp}.png"
+        self.log(f"Max INL: {metrics['max_inl']:.4f} LSB")
+        self.log(f"Max DNL: {metrics['max_dnl']:.4f} LSB")
+
+        # Save Plot: the rendered pixels are copied here, PNG encoding and the
+        # write run on the save thread (see wait_for_plot_saves). ts_suffix keeps
+        # two plots saved within the same second apart.
+        img_filename = f"{PLOT_PREFIX}{utils.ts_suffix()}.png"
+        rgba = np.array(self.canvas.buffer_rgba())
+        self._plot_saves = [f for f in self._plot_saves if not f.done()]
+        self._plot_saves.append(self._save_pool.submit(self._write_plot, img_filename, rgba))
+
+    def _write_plot(self, img_filename, rgba):
+        # Save thread; the result is reported back through plot_saved (queued)
+        from matplotlib.image import imsave
         try:
-            self.figure.savefig(img_filename)
-            self.log(f"Plot saved to {img_filename}")
+            os.makedirs(PLOT_FOLDER, exist_ok=True)
+            imsave(img_filename, rgba)
+            self.plot_saved.emit(img_filename, "")
         except Exception as e:
-            self.log(f"Error saving plot: {e}")
+            self.plot_saved.emit(img_filename, str(e))
+
+    def on_plot_saved(self, img_filename, error):
+        if error:
+            self.log(f"Error saving plot: {error}")
+        else:
+            self.log(f"Plot saved to {img_filename}")
+
+    def wait_for_plot_saves(self):
+        """
+        Blocks until every queued plot PNG is on disk (used before result files
+        are picked up by name).
+        """
+        for future in self._plot_saves:
+            future.result()
+        self._plot_saves = []
@@ -1,3 +1,4 @@
+import numpy as np
 from PySide6.QtCore import QThread, Signal
 from core import test_logic
 
@@ -19,6 +20,7 @@ class PowerWorker(QThread):
         )
         
         self.logic.run_power_sequence(self.context, mode=self.mode)
+        self.context.flush()
         self.finished_signal.emit()
 
     def stop(self):
@@ -34,6 +36,16 @@ class LinearityWorker(QThread):
     def __init__(self, instrument_manager, source_type, start_v, step_v, points, dac_alias, dac_ch, dm_alias, dg_alias):
         super().__init__()
         self.logic = test_logic.LinearityTestLogic(instrument_manager)
+        self.configure(source_type, start_v, step_v, points, dac_alias, dac_ch, dm_alias, dg_alias)
+        self.context = None
+        # Metrics dict of the finished run (None if it produced none); set before finished_signal
+        self.last_metrics = None
+
+    def configure(self, source_type, start_v, step_v, points, dac_alias, dac_ch, dm_alias, dg_alias):
+        """
+        Sets the parameters for the next run; the worker can be start()ed again
+        once the previous run has finished.
+        """
         self.source_type = source_type
         self.start_v = start_v
         self.step_v = step_v
@@ -42,9 +54,9 @@ class LinearityWorker(QThread):
         self.dac_ch = dac_ch
         self.dm_alias = dm_alias
         self.dg_alias = dg_alias
-        self.context = None
 
     def run(self):
+        self.last_metrics = None
         self.context = test_logic.TestContext(
             log_callback=self.log_signal.emit,
             progress_callback=self.progress_signal.emit
@@ -61,10 +73,14 @@ class LinearityWorker(QThread):
             self.dm_alias,
             self.dg_alias
         )
+        self.context.flush()
         
         if results:
             input_vals, measured_vals, metrics = results
             if metrics:
+                # Fit line for the plot, computed here instead of on the GUI thread
+                metrics['y_fit'] = np.asarray(input_vals, dtype=float) * metrics['gain'] + metrics['offset']
+                self.last_metrics = metrics
                 self.result_signal.emit(input_vals, measured_vals, metrics)
 
         self.finished_signal.emit()
@@ -72,3 +88,38 @@ class LinearityWorker(QThread):
     def stop(self):
         if self.context:
             self.context.request_stop()
+
+class ConfigWorker(QThread):
+    log_signal = Signal(str)
+    finished_signal = Signal()
+
+    def __init__(self, instrument_manager, kind="DAC", dac_alias=None,
+                 dac_configs=None, power_configs=None):
+        super().__init__()
+        self.logic = test_logic.ConfigApplyLogic(instrument_manager)
+        self.kind = kind # "DAC", "PWR" or "ALL" (DAC then power)
+        self.dac_alias = dac_alias
+        # Rows/items to apply instead of the config files (None = read the file)
+        self.dac_configs = dac_configs
+        self.power_configs = power_configs
+        self.context = None
+        self.error = None
+
+    def run(self):
+        self.context = test_logic.TestContext(
+            log_callback=self.log_signal.emit,
+            progress_callback=None
+        )
+        self.error = None
+
+        try:
+            if self.kind in ("DAC", "ALL"):
+                self.logic.apply_dac_config(self.context, self.dac_alias, self.dac_configs)
+            if self.kind in ("PWR", "ALL"):
+                self.logic.apply_power_config(self.context, self.power_configs)
+        except Exception as e:
+            # Always reach finished_signal so callers waiting on it can react
+            self.error = e
+            self.context.log(f"Config Error: {e}")
+        self.context.flush()
+        self.finished_signal.emit()
@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from automation.config_manager import ConfigManager
+from core import utils
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class DacPatchCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "DAC_Config.csv")
+        shutil.copy(os.path.join(REPO_DIR, "DAC_Config.csv"), self.path)
+        self.cm = ConfigManager()
+        self.cm.dac_config_path = self.path
+
+    def tearDown(self):
+        utils.invalidate_config_cache(self.path)
+        shutil.rmtree(self.tmp)
+
+    def test_patch_within_one_mtime_tick_is_seen_by_load_dac_channels(self):
+        self.cm.modify_dac_config(1)  # full rewrite, records the field offsets
+        self.cm.modify_dac_config(2)  # in-place patch
+        self.assertEqual(utils.load_dac_channels(self.path)[3]['voltage'], -2.5)
+        st = os.stat(self.path)
+
+        self.cm.modify_dac_config(3)  # in-place patch, same file size
+        # Pin the mtime as if the patch landed in the same timestamp tick
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertEqual(os.stat(self.path).st_size, st.st_size)
+
+        channels = utils.load_dac_channels(self.path)
+        self.assertEqual(channels[3]['voltage'], -4.5)
+        self.assertEqual(channels[4]['voltage'], -2.5)
+
+    def test_patch_moves_the_mtime_on(self):
+        self.cm.modify_dac_config(1)
+        before = os.stat(self.path).st_mtime_ns
+        self.cm.modify_dac_config(2)
+        self.assertGreater(os.stat(self.path).st_mtime_ns, before)
+
+
+if __name__ == "__main__":
+    unittest.main()
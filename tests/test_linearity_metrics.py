@@ -0,0 +1,53 @@
+import math
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from core import utils
+from core._linearity_numba import _linearity_kernel
+
+METRIC_KEYS = ("gain", "offset", "lsb_ideal", "nonlinearity_pct", "max_inl", "max_dnl")
+
+
+def _sweep():
+    x = np.linspace(-10.0, 10.0, 21)
+    y = x * 1.002 + 0.001 + np.sin(x) * 1e-4
+    return x, y
+
+
+class LinearityKernelParityTest(unittest.TestCase):
+    """
+    The kernel is checked uncompiled (same code numba compiles), installed as
+    utils.linearity_kernel so the dispatch in calculate_linearity_metrics runs.
+    """
+
+    def _metrics(self, x, y, kernel):
+        with mock.patch.object(utils, "linearity_kernel", kernel):
+            return utils.calculate_linearity_metrics(x, y)
+
+    def test_kernel_matches_numpy(self):
+        x, y = _sweep()
+        fast = self._metrics(x, y, _linearity_kernel)
+        ref = self._metrics(x, y, None)
+        for key in METRIC_KEYS:
+            self.assertAlmostEqual(fast[key], ref[key], places=9, msg=key)
+        np.testing.assert_allclose(fast["inl"], ref["inl"], rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(fast["dnl"], ref["dnl"], rtol=1e-9, atol=1e-12)
+
+    def test_nan_point_gives_nan_metrics_on_both_paths(self):
+        x, y = _sweep()
+        y[7] = np.nan
+        fast = self._metrics(x, y, _linearity_kernel)
+        ref = self._metrics(x, y, None)
+        for key in ("max_inl", "max_dnl"):
+            self.assertTrue(math.isnan(ref[key]), key)
+        for key in METRIC_KEYS:
+            if math.isnan(ref[key]):
+                self.assertTrue(math.isnan(fast[key]), key)
+            else:
+                self.assertEqual(fast[key], ref[key], key)
+
+
+if __name__ == "__main__":
+    unittest.main()